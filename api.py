@@ -1,24 +1,44 @@
 # /opt/oper-kassa-bot/api.py
+import logging
 import os
-from flask import Flask, jsonify, request, session, redirect, url_for, render_template_string
+from flask import Flask, jsonify, request, session, redirect, url_for, render_template_string, make_response
 from flask_cors import CORS
-from pymongo import MongoClient
 from dotenv import load_dotenv
 from datetime import datetime
 from functools import wraps
+from scheduler import RateScheduler, public_job
+from storage import create_backend
+from rates_log import RateChangeLog, compact, parse_version
+from board import BOARD_TEXT, BoardCache, render_html, render_svg, render_png
 
 load_dotenv('/opt/oper-kassa-bot/.env')
 
 MONGO_URI = os.getenv("MONGO_URI")
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")  # mongo или sqlite
+SQLITE_PATH = os.getenv("SQLITE_PATH")  # по умолчанию operkassa.db рядом с кодом
 ADMIN_PASSWORD = os.getenv("BOT_PASSWORD")
 SECRET_KEY = os.getenv("SECRET_KEY", os.urandom(24).hex())
+RATES_LOG_SIZE = int(os.getenv("RATES_LOG_SIZE", "256"))
+RATES_REFRESH_SECONDS = float(os.getenv("RATES_REFRESH_SECONDS", "1"))
+BOARD_REFRESH_SECONDS = int(os.getenv("BOARD_REFRESH_SECONDS", "10"))
+BOARD_FONT = os.getenv("BOARD_FONT", "DejaVuSans.ttf")
+# Филиалы для табло: "center:Центральный офис,north:Северный филиал"
+BOARD_BRANCHES = dict(
+    item.split(":", 1) for item in os.getenv("BOARD_BRANCHES", "").split(",") if ":" in item
+)
 
-if not MONGO_URI:
+if STORAGE_BACKEND == "mongo" and not MONGO_URI:
     raise RuntimeError("MONGO_URI не установлен в /opt/oper-kassa-bot/.env")
 
-client = MongoClient(MONGO_URI)
-db = client["operkassa_db"]
-rates_collection = db["rates"]
+storage = create_backend(STORAGE_BACKEND, mongo_uri=MONGO_URI, sqlite_path=SQLITE_PATH)
+rates_log = RateChangeLog(
+    storage.list_rates,
+    max_entries=RATES_LOG_SIZE,
+    max_age=RATES_REFRESH_SECONDS
+)
+scheduler = RateScheduler(storage, on_applied=lambda jobs: rates_log.refresh(force=True))
+scheduler.start()
+board_cache = BoardCache()
 
 app = Flask(__name__)
 app.secret_key = SECRET_KEY
@@ -33,16 +53,69 @@ def login_required(f):
     return decorated
 @app.route("/api/rates", methods=["GET"])
 def get_rates():
+    since = request.args.get("since")
+    if since is not None:
+        try:
+            parse_version(since)
+        except ValueError:
+            return jsonify({"error": "Неверная версия", "detail": "since должен иметь вид <эпоха>-<номер>"}), 400
     try:
-        data = list(rates_collection.find({}, {"_id": 0}))
-        return jsonify({"currencies": data}), 200
+        rates_log.refresh()
     except Exception as e:
         return jsonify({"error": "Не удалось получить курсы", "detail": str(e)}), 500
 
+    version, full, currencies, removed = rates_log.changes_since(since)
+    if request.args.get("format") == "compact":
+        return jsonify(compact(version, full, currencies, removed)), 200
+    if since is None:
+        return jsonify({"currencies": currencies, "version": version}), 200
+    return jsonify({"version": version, "full": full, "currencies": currencies, "removed": removed}), 200
+
+BOARD_FORMATS = {
+    "html": ("text/html; charset=utf-8", lambda rates, lang, branch: render_html(rates, lang, branch, BOARD_REFRESH_SECONDS)),
+    "svg": ("image/svg+xml; charset=utf-8", render_svg),
+    "png": ("image/png", lambda rates, lang, branch: render_png(rates, lang, branch, BOARD_FONT)),
+}
+
+@app.route("/board", defaults={"fmt": "html"}, methods=["GET"])
+@app.route("/board.<fmt>", methods=["GET"])
+def rates_board(fmt):
+    lang = request.args.get("lang", "ru")
+    branch = request.args.get("branch")
+    if fmt not in BOARD_FORMATS or lang not in BOARD_TEXT:
+        return jsonify({"error": "Неизвестный формат или язык"}), 404
+    if branch and branch not in BOARD_BRANCHES:
+        return jsonify({"error": "Неизвестный филиал"}), 404
+    try:
+        rates_log.refresh()
+    except Exception as e:
+        return jsonify({"error": "Не удалось получить курсы", "detail": str(e)}), 500
+
+    version, rates = rates_log.snapshot()
+    content_type, render = BOARD_FORMATS[fmt]
+    title = BOARD_BRANCHES.get(branch)
+    try:
+        body, etag = board_cache.get(
+            (fmt, branch or "all", lang),
+            version,
+            lambda: render(rates, lang, title)
+        )
+    except ImportError:
+        return jsonify({"error": "Для PNG требуется Pillow"}), 501
+    except OSError as e:
+        logging.error(f"❌ Не удалось открыть шрифт табло BOARD_FONT={BOARD_FONT}: {e}")
+        return jsonify({"error": "Шрифт для PNG недоступен", "detail": str(e)}), 503
+
+    response = make_response(body)
+    response.headers["Content-Type"] = content_type
+    response.headers["Cache-Control"] = "no-cache"
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
 @app.route("/api/health", methods=["GET"])
 def health():
     try:
-        client.admin.command("ping")
+        storage.ping()
         return jsonify({"status": "ok", "time": datetime.utcnow().isoformat()}), 200
     except Exception as e:
         return jsonify({"status": "error", "detail": str(e)}), 500
@@ -252,10 +325,19 @@ ADMIN_HTML = """<!DOCTYPE html>
   .save-btn:hover { background: var(--accent); color: #0a0a0a; }
   .save-btn:disabled { opacity: 0.3; cursor: not-allowed; }
   .save-btn:disabled:hover { background: transparent; color: var(--accent); }
+  .section-title { font-size: 0.65rem; letter-spacing: 0.25em; text-transform: uppercase; color: var(--muted); margin: 48px 0 16px; }
+  .schedule-form { background: var(--surface); border: 1px solid var(--border); padding: 28px; display: grid; grid-template-columns: 1.2fr 1fr 1fr 1.4fr auto; gap: 12px; align-items: end; }
+  .schedule-form select { width: 100%; background: var(--bg); border: 1px solid var(--border); color: var(--text); font-family: 'IBM Plex Mono', monospace; font-size: 0.85rem; padding: 10px 12px; outline: none; }
+  .schedule-form .save-btn { width: auto; padding: 12px 18px; }
+  .job-row { display: flex; align-items: center; justify-content: space-between; gap: 12px; background: var(--surface); border: 1px solid var(--border); border-top: none; padding: 14px 28px; font-size: 0.75rem; }
+  .job-row .muted { color: var(--muted2); }
+  .job-cancel { background: transparent; border: 1px solid var(--border); color: var(--muted); font-family: 'IBM Plex Mono', monospace; font-size: 0.6rem; letter-spacing: 0.15em; text-transform: uppercase; padding: 6px 12px; cursor: pointer; transition: all 0.15s; }
+  .job-cancel:hover { color: var(--error); border-color: var(--error); }
   @media (max-width: 600px) {
     header { padding: 16px 20px; }
     main { padding: 32px 20px; }
     .grid { grid-template-columns: 1fr; }
+    .schedule-form { grid-template-columns: 1fr; }
   }
 </style>
 </head>
@@ -263,13 +345,22 @@ ADMIN_HTML = """<!DOCTYPE html>
 <header>
   <div class="logo">OperKassa</div>
   <div class="header-right">
-    <div class="status-dot"><span class="dot"></span><span>MongoDB подключена</span></div>
+    <div class="status-dot"><span class="dot"></span><span>{{ storage_name }} подключена</span></div>
     <a href="/admin/logout" class="logout">Выйти</a>
   </div>
 </header>
 <main>
   <div class="page-title">Управление курсами валют</div>
   <div class="grid" id="grid">Загрузка...</div>
+  <div class="section-title">Запланированные изменения</div>
+  <div class="schedule-form rate-field">
+    <div><label>Валюта</label><select id="sched_code"></select></div>
+    <div><label>Покупка ₽</label><input type="number" step="0.01" id="sched_buy"></div>
+    <div><label>Продажа ₽</label><input type="number" step="0.01" id="sched_sell"></div>
+    <div><label>Применить</label><input type="datetime-local" id="sched_at"></div>
+    <button class="save-btn" onclick="scheduleRate(this)">Запланировать</button>
+  </div>
+  <div id="jobs"></div>
 </main>
 <div id="toast"></div>
 <script>
@@ -325,6 +416,9 @@ async function loadRates() {
     const res = await fetch('/api/rates');
     const { currencies } = await res.json();
     grid.innerHTML = '';
+    document.getElementById('sched_code').innerHTML = currencies
+      .filter(c => c.showRates)
+      .map(c => `<option value="${c.code}">${NAMES[c.code] || c.code}</option>`).join('');
     currencies.forEach(c => {
       const show = c.showRates;
       const card = document.createElement('div');
@@ -359,7 +453,61 @@ async function loadRates() {
   }
 }
 
+async function loadJobs() {
+  const box = document.getElementById('jobs');
+  try {
+    const res = await fetch('/admin/schedule');
+    const { jobs } = await res.json();
+    box.innerHTML = '';
+    jobs.forEach(j => {
+      const row = document.createElement('div');
+      row.className = 'job-row';
+      row.innerHTML = `
+        <span>${NAMES[j.code] || j.code}</span>
+        <span class="muted">${j.buy.toFixed(2)} / ${j.sell.toFixed(2)} ₽</span>
+        <span class="muted">${formatTime(j.run_at)}</span>
+        <button class="job-cancel" onclick="cancelJob('${j.id}')">Отменить</button>`;
+      box.appendChild(row);
+    });
+  } catch(e) {
+    box.innerHTML = '<div class="job-row" style="color:var(--error)">Ошибка загрузки заданий</div>';
+  }
+}
+
+async function scheduleRate(btn) {
+  const code = document.getElementById('sched_code').value;
+  const buy  = parseFloat(document.getElementById('sched_buy').value.replace(',', '.'));
+  const sell = parseFloat(document.getElementById('sched_sell').value.replace(',', '.'));
+  const at   = document.getElementById('sched_at').value;
+  if (isNaN(buy) || isNaN(sell) || buy <= 0 || sell <= 0) { showToast('Введите корректные числа', true); return; }
+  if (sell <= buy) { showToast('Курс продажи должен быть выше покупки', true); return; }
+  if (!at) { showToast('Укажите время применения', true); return; }
+  btn.disabled = true;
+  try {
+    const res = await fetch('/admin/schedule', {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: JSON.stringify({code, buy, sell, at})
+    });
+    const data = await res.json();
+    if (data.ok) { showToast('✓ Изменение запланировано'); loadJobs(); }
+    else showToast('Ошибка: ' + (data.error || 'неизвестно'), true);
+  } catch(e) { showToast('Ошибка соединения', true); }
+  finally { btn.disabled = false; }
+}
+
+async function cancelJob(id) {
+  try {
+    const res = await fetch('/admin/schedule/' + id, {method: 'DELETE'});
+    const data = await res.json();
+    if (data.ok) showToast('✓ Изменение отменено');
+    else showToast('Ошибка: ' + (data.error || 'неизвестно'), true);
+  } catch(e) { showToast('Ошибка соединения', true); }
+  loadJobs();
+}
+
 loadRates();
+loadJobs();
 </script>
 </body>
 </html>"""
@@ -377,7 +525,7 @@ def admin_login():
 @app.route("/admin")
 @login_required
 def admin_panel():
-    return render_template_string(ADMIN_HTML)
+    return render_template_string(ADMIN_HTML, storage_name=storage.name)
 
 @app.route("/admin/update", methods=["POST"])
 @login_required
@@ -389,15 +537,45 @@ def admin_update():
     if not code or buy is None or sell is None:
         return jsonify({"ok": False, "error": "Неверные данные"}), 400
     try:
-        rates_collection.update_one(
-            {"code": code},
-            {"$set": {"buy": float(buy), "sell": float(sell), "updated": datetime.now().isoformat()}},
-            upsert=True
-        )
+        storage.update_rate(code, buy, sell, datetime.now().isoformat())
+        rates_log.refresh(force=True)
         return jsonify({"ok": True})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
+@app.route("/admin/schedule", methods=["GET"])
+@login_required
+def admin_schedule_list():
+    try:
+        return jsonify({"jobs": [public_job(j) for j in scheduler.pending()]})
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+@app.route("/admin/schedule", methods=["POST"])
+@login_required
+def admin_schedule():
+    data = request.get_json() or {}
+    code = data.get("code")
+    if not code or data.get("buy") is None or data.get("sell") is None or not data.get("at"):
+        return jsonify({"ok": False, "error": "Неверные данные"}), 400
+    try:
+        job = scheduler.schedule(code, data["buy"], data["sell"], data["at"], source="admin")
+        return jsonify({"ok": True, "job": public_job(job)})
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+@app.route("/admin/schedule/<job_id>", methods=["DELETE"])
+@login_required
+def admin_unschedule(job_id):
+    try:
+        if scheduler.cancel(job_id):
+            return jsonify({"ok": True})
+        return jsonify({"ok": False, "error": "Изменение уже применено или отменено"}), 404
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+
 @app.route("/admin/logout")
 def admin_logout():
     session.clear()
@@ -0,0 +1,109 @@
+"""Сравнение задержек чтения и записи курсов в хранилищах.
+
+Пример: python bench_storage.py --ops 2000 --readers 4
+SQLite замеряется всегда (временный файл в WAL), MongoDB — если задан MONGO_URI
+(во временной базе operkassa_bench, которая удаляется после замера).
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from storage import MongoBackend, SQLiteBackend
+
+RATES = [
+    {'code': 'USD_BLUE', 'flag': 'us', 'name': 'Доллар США (синий)', 'showRates': True, 'buy': 81.5, 'sell': 82.2},
+    {'code': 'USD_WHITE', 'flag': 'us', 'name': 'Доллар США (белый)', 'showRates': True, 'buy': 80.5, 'sell': 81.5},
+    {'code': 'EUR', 'flag': 'eu', 'name': 'Евро', 'showRates': True, 'buy': 94.5, 'sell': 96.0},
+    {'code': 'GBP', 'flag': 'gb', 'name': 'Фунт стерлингов', 'showRates': False, 'buy': 0.0, 'sell': 0.0},
+    {'code': 'CNY', 'flag': 'cn', 'name': 'Китайский юань', 'showRates': False, 'buy': 0.0, 'sell': 0.0},
+    {'code': 'RUB', 'flag': 'ru', 'name': 'Российский рубль', 'showRates': True, 'buy': 1.0, 'sell': 1.0},
+]
+
+
+def summary(samples):
+    samples = sorted(samples)
+    return {
+        'ops': len(samples),
+        'p50_ms': round(samples[len(samples) // 2] * 1000, 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3),
+    }
+
+
+def timed(func, ops):
+    samples = []
+    for i in range(ops):
+        start = time.perf_counter()
+        func(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench(backend, ops, readers):
+    now = datetime.now().isoformat()
+    report = {
+        'read': summary(timed(lambda i: backend.list_rates(), ops)),
+        'write': summary(timed(lambda i: backend.update_rate('USD_BLUE', 81.5 + i % 10 / 100, 82.2, now), ops)),
+    }
+
+    # Чтение параллельно с записью: так бот и API работают с одной базой
+    samples = []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def reader():
+        local = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            backend.list_rates()
+            local.append(time.perf_counter() - start)
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    writes = timed(lambda i: backend.update_rate('EUR', 94.5 + i % 10 / 100, 96.0, now), ops // 4)
+    stop.set()
+    for t in threads:
+        t.join()
+    report[f'read_with_{readers}_readers_and_writer'] = summary(samples)
+    report['write_under_readers'] = summary(writes)
+    return report
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ops', type=int, default=1000, help='операций на замер')
+    parser.add_argument('--readers', type=int, default=4, help='параллельных читателей')
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite = SQLiteBackend(os.path.join(tmp, 'bench.db'))
+        sqlite.replace_rates(RATES)
+        results['sqlite'] = bench(sqlite, args.ops, args.readers)
+        sqlite.close()
+
+    mongo_uri = os.getenv("MONGO_URI")
+    if mongo_uri:
+        mongo = MongoBackend(mongo_uri, db_name="operkassa_bench")
+        try:
+            mongo.replace_rates(RATES)
+            results['mongo'] = bench(mongo, args.ops, args.readers)
+        finally:
+            mongo.client.drop_database("operkassa_bench")
+            mongo.close()
+
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Замер исходящего клиента Bot API на локальном фейковом сервере.
+
+Пример: python bench_tgclient.py --messages 500 --rate-429 0.05 --rate-5xx 0.02
+"""
+import argparse
+import json
+import threading
+import time
+
+import telebot
+
+from fake_bot_api import FakeBotAPI
+from tgclient import TelegramClient
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200, help='сообщений всего')
+    parser.add_argument('--threads', type=int, default=8, help='параллельных отправителей')
+    parser.add_argument('--bulk-share', type=float, default=0.5, help='доля массовых отправок')
+    parser.add_argument('--rate-429', type=float, default=0.05)
+    parser.add_argument('--rate-5xx', type=float, default=0.02)
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.01, help='задержка ответа сервера, с')
+    parser.add_argument('--pool-size', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    server = FakeBotAPI(
+        rate_429=args.rate_429, rate_5xx=args.rate_5xx,
+        retry_after=args.retry_after, latency=args.latency
+    ).start()
+    client = TelegramClient(pool_size=args.pool_size, workers=args.workers, backoff=0.1)
+    client.install(server.url)
+    bot = telebot.TeleBot('123456:BENCH', threaded=False)
+
+    per_thread = args.messages // args.threads
+    bulk_threads = int(args.threads * args.bulk_share)
+    failures = []
+    latencies = {'interactive': [], 'bulk': []}
+
+    def sender(index):
+        kind = 'bulk' if index < bulk_threads else 'interactive'
+        for i in range(per_thread):
+            start = time.perf_counter()
+            try:
+                if kind == 'bulk':
+                    with client.bulk():
+                        bot.send_message(1000 + index, f"bulk {i}")
+                else:
+                    bot.send_message(1000 + index, f"reply {i}")
+            except Exception as e:
+                failures.append(str(e))
+            latencies[kind].append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=sender, args=(i,)) for i in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    server.stop()
+
+    report = {'elapsed_s': round(elapsed, 2), 'sent_per_s': round(per_thread * args.threads / elapsed, 1),
+              'failures': len(failures), 'client': client.stats()}
+    for kind, samples in latencies.items():
+        if samples:
+            samples.sort()
+            report[f'{kind}_p50_ms'] = round(samples[len(samples) // 2] * 1000, 1)
+            report[f'{kind}_p95_ms'] = round(samples[int(len(samples) * 0.95) - 1] * 1000, 1)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
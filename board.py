@@ -0,0 +1,188 @@
+import io
+import threading
+from datetime import datetime
+from html import escape
+
+BOARD_TEXT = {
+    'ru': {
+        'title': 'Курсы валют',
+        'buy': 'Покупка',
+        'sell': 'Продажа',
+        'on_request': 'уточняйте по телефону',
+        'updated': 'Обновлено',
+    },
+    'en': {
+        'title': 'Exchange rates',
+        'buy': 'We buy',
+        'sell': 'We sell',
+        'on_request': 'call for rates',
+        'updated': 'Updated',
+    },
+}
+
+NAMES_EN = {
+    'USD_BLUE': 'US Dollar (blue)',
+    'USD_WHITE': 'US Dollar (white)',
+    'EUR': 'Euro',
+    'GBP': 'Pound sterling',
+    'CNY': 'Chinese yuan',
+    'RUB': 'Russian ruble',
+}
+
+WIDTH = 960
+ROW_HEIGHT = 72
+HEADER_HEIGHT = 120
+FOOTER_HEIGHT = 56
+BG, SURFACE, ACCENT, TEXT, MUTED = '#0a0a0a', '#111111', '#c8f135', '#f0f0f0', '#888888'
+
+
+def board_rows(currencies, lang='ru'):
+    """Строки табло по тем же правилам, что и show_current_rates в боте"""
+    rows = []
+    for currency in currencies:
+        name = currency.get('name', currency['code'])
+        if lang == 'en':
+            name = NAMES_EN.get(currency['code'], currency['code'])
+        show = currency.get('showRates', False)
+        rows.append({
+            'code': currency['code'],
+            'name': name,
+            'buy': f"{currency.get('buy', 0):.2f}" if show else None,
+            'sell': f"{currency.get('sell', 0):.2f}" if show else None,
+        })
+    return rows
+
+
+def last_updated(currencies):
+    """Время последнего обновления курсов, ЧЧ:ММ"""
+    stamps = [c['updated'] for c in currencies if c.get('updated')]
+    try:
+        return datetime.fromisoformat(max(stamps)).strftime('%H:%M') if stamps else '—'
+    except ValueError:
+        return '—'
+
+
+def render_html(currencies, lang='ru', branch=None, refresh=10):
+    text = BOARD_TEXT[lang]
+    title = escape(branch or text['title'])
+    body = ""
+    for row in board_rows(currencies, lang):
+        if row['buy'] is None:
+            rates = f'<td colspan="2" class="muted">{text["on_request"]}</td>'
+        else:
+            rates = f'<td>{row["buy"]}</td><td>{row["sell"]}</td>'
+        body += f'<tr><th>{escape(row["name"])}<small>{row["code"]}</small></th>{rates}</tr>\n'
+    return f"""<!DOCTYPE html>
+<html lang="{lang}">
+<head>
+<meta charset="UTF-8">
+<meta http-equiv="refresh" content="{refresh}">
+<meta name="viewport" content="width=device-width, initial-scale=1.0">
+<title>{title}</title>
+<style>
+  * {{ box-sizing: border-box; margin: 0; padding: 0; }}
+  body {{ background: {BG}; color: {TEXT}; font-family: 'IBM Plex Mono', monospace; padding: 4vh 4vw; }}
+  h1 {{ color: {ACCENT}; font-size: 5vh; letter-spacing: 0.05em; margin-bottom: 3vh; }}
+  table {{ width: 100%; border-collapse: collapse; font-size: 4vh; }}
+  th, td {{ padding: 1.6vh 1vw; border-bottom: 1px solid #222; text-align: right; }}
+  th {{ text-align: left; font-weight: 500; }}
+  th small {{ display: block; font-size: 1.8vh; color: {MUTED}; letter-spacing: 0.1em; }}
+  thead td {{ font-size: 2vh; color: {MUTED}; text-transform: uppercase; letter-spacing: 0.2em; }}
+  .muted {{ color: {MUTED}; font-size: 2.6vh; }}
+  footer {{ margin-top: 3vh; font-size: 2vh; color: {MUTED}; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+<table>
+<thead><tr><td></td><td>{text['buy']} ₽</td><td>{text['sell']} ₽</td></tr></thead>
+<tbody>
+{body}</tbody>
+</table>
+<footer>{text['updated']}: {last_updated(currencies)}</footer>
+</body>
+</html>"""
+
+
+def _layout(currencies, lang, branch):
+    """Общая разметка SVG и PNG: список (x, y, текст, размер, цвет, выравнивание)"""
+    text = BOARD_TEXT[lang]
+    rows = board_rows(currencies, lang)
+    height = HEADER_HEIGHT + ROW_HEIGHT * len(rows) + FOOTER_HEIGHT
+    items = [
+        (40, 64, branch or text['title'], 40, ACCENT, 'start'),
+        (700, 104, f"{text['buy']} ₽", 16, MUTED, 'end'),
+        (920, 104, f"{text['sell']} ₽", 16, MUTED, 'end'),
+    ]
+    for i, row in enumerate(rows):
+        y = HEADER_HEIGHT + i * ROW_HEIGHT + 46
+        items.append((40, y, row['name'], 28, TEXT, 'start'))
+        if row['buy'] is None:
+            items.append((920, y, text['on_request'], 20, MUTED, 'end'))
+        else:
+            items.append((700, y, row['buy'], 32, TEXT, 'end'))
+            items.append((920, y, row['sell'], 32, TEXT, 'end'))
+    items.append((40, height - 22, f"{text['updated']}: {last_updated(currencies)}", 16, MUTED, 'start'))
+    return height, len(rows), items
+
+
+def render_svg(currencies, lang='ru', branch=None):
+    height, count, items = _layout(currencies, lang, branch)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}" height="{height}" viewBox="0 0 {WIDTH} {height}">',
+        f'<rect width="100%" height="100%" fill="{BG}"/>',
+    ]
+    for i in range(count):
+        y = HEADER_HEIGHT + i * ROW_HEIGHT
+        parts.append(f'<rect x="0" y="{y}" width="{WIDTH}" height="{ROW_HEIGHT - 2}" fill="{SURFACE}"/>')
+    for x, y, label, size, color, anchor in items:
+        parts.append(
+            f'<text x="{x}" y="{y}" font-family="IBM Plex Mono, DejaVu Sans Mono, monospace" '
+            f'font-size="{size}" fill="{color}" text-anchor="{anchor}">{escape(label)}</text>'
+        )
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+def render_png(currencies, lang='ru', branch=None, font_path='DejaVuSans.ttf'):
+    # Pillow нужен только для PNG, поэтому импортируется здесь
+    from PIL import Image, ImageDraw, ImageFont
+
+    height, count, items = _layout(currencies, lang, branch)
+    image = Image.new('RGB', (WIDTH, height), BG)
+    draw = ImageDraw.Draw(image)
+    for i in range(count):
+        y = HEADER_HEIGHT + i * ROW_HEIGHT
+        draw.rectangle([0, y, WIDTH, y + ROW_HEIGHT - 2], fill=SURFACE)
+
+    # Без шрифта OSError: встроенный шрифт Pillow не знает кириллицы и ₽
+    # и не масштабируется, такое табло нельзя отдавать и кешировать
+    fonts = {}
+    for x, y, label, size, color, anchor in items:
+        if size not in fonts:
+            fonts[size] = ImageFont.truetype(font_path, size)
+        draw.text((x, y), label, font=fonts[size], fill=color, anchor='rs' if anchor == 'end' else 'ls')
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+class BoardCache:
+    """Кеш отрисованных табло: по варианту хранится только текущая версия курсов"""
+
+    def __init__(self):
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def get(self, variant, version, render):
+        """(тело, etag) для варианта; render вызывается только при смене версии"""
+        with self._lock:
+            cached = self._items.get(variant)
+            if cached and cached[0] == version:
+                return cached[1], cached[2]
+        body = render()
+        etag = f"{'-'.join(str(v) for v in variant)}-{version}"
+        with self._lock:
+            self._items[variant] = (version, body, etag)
+        return body, etag
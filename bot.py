@@ -7,11 +7,13 @@ import telebot
 from telebot import types
 import signal
 import sys
-from threading import Thread
-import time
+from functools import wraps
 from dotenv import load_dotenv
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
+from scheduler import RateScheduler, parse_run_at, validate_rates
+from health import BotWatchdog
+from tgclient import TelegramClient
+from storage import create_backend
+from keypad import KEYPAD_RE, EditSessions, apply_keypad_key
 
 load_dotenv()
 
@@ -26,8 +28,18 @@ logging.basicConfig(
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 BOT_PASSWORD = os.getenv('BOT_PASSWORD')
 MONGO_URI = os.getenv("MONGO_URI")
-
-if not MONGO_URI:
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")  # mongo или sqlite
+SQLITE_PATH = os.getenv("SQLITE_PATH")  # по умолчанию operkassa.db рядом с кодом; ':memory:' — для loadtest.py
+HEALTH_HOST = os.getenv("HEALTH_HOST", "127.0.0.1")
+HEALTH_PORT = int(os.getenv("HEALTH_PORT", "8080"))
+POLL_STALL_TIMEOUT = int(os.getenv("POLL_STALL_TIMEOUT", "300"))
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")  # другой сервер Bot API, например локальный для замеров
+TG_POOL_SIZE = int(os.getenv("TG_POOL_SIZE", "10"))
+TG_WORKERS = int(os.getenv("TG_WORKERS", "4"))
+TG_RETRIES = int(os.getenv("TG_RETRIES", "3"))
+EDIT_SESSION_TTL = int(os.getenv("EDIT_SESSION_TTL", "900"))  # секунд без нажатий до закрытия редактора
+
+if STORAGE_BACKEND == "mongo" and not MONGO_URI:
     raise ValueError("MONGO_URI не установлен в .env!")
 
 if not TELEGRAM_TOKEN:
@@ -35,20 +47,23 @@ if not TELEGRAM_TOKEN:
 if not BOT_PASSWORD:
     raise ValueError("BOT_PASSWORD не установлен в переменных окружения!")
 
-client = MongoClient(MONGO_URI, server_api=ServerApi('1'))
-db = client["operkassa_db"]  # имя базы
-rates_collection = db["rates"]  # коллекция с курсами
+storage = create_backend(STORAGE_BACKEND, mongo_uri=MONGO_URI, sqlite_path=SQLITE_PATH, server_api="1")
 
 try:
-    client.admin.command("ping")
-    logging.info("✅ Успешно подключено к MongoDB Atlas!")
+    storage.ping()
+    logging.info(f"✅ Успешно подключено к {storage.name}!")
 except Exception as e:
-    logging.error(f"❌ Ошибка подключения к MongoDB: {e}")
+    logging.error(f"❌ Ошибка подключения к {storage.name}: {e}")
     raise
 
 
+tg_client = TelegramClient(pool_size=TG_POOL_SIZE, workers=TG_WORKERS, retries=TG_RETRIES)
+tg_client.install(TELEGRAM_API_URL)
+
 bot = telebot.TeleBot(TELEGRAM_TOKEN)
 authorized_users = {}
+pending_auth = set()  # user_id, от которых ожидается пароль
+edit_sessions = EditSessions(ttl=EDIT_SESSION_TTL)
 
 class CurrencyManager:
     def __init__(self):
@@ -63,7 +78,7 @@ class CurrencyManager:
 
     def get_current_rates(self):
         try:
-            rates = list(rates_collection.find({}, {"_id": 0}))
+            rates = storage.list_rates()
             if not rates:
                 self.initialize_rates()
                 return self.get_current_rates()
@@ -91,25 +106,14 @@ class CurrencyManager:
                 curr['updated'] = datetime.now().isoformat()
                 initial_rates.append(curr)
 
-            rates_collection.delete_many({})
-            rates_collection.insert_many(initial_rates)
-            logging.info("✅ Базовые курсы сохранены в MongoDB")
+            storage.replace_rates(initial_rates)
+            logging.info(f"✅ Базовые курсы сохранены в {storage.name}")
         except Exception as e:
             logging.error(f"Ошибка инициализации курсов: {e}")
 
     def update_currency_rate(self, currency_code, buy_rate, sell_rate):
         try:
-            result = rates_collection.update_one(
-                {"code": currency_code},
-                {
-                    "$set": {
-                        "buy": float(buy_rate),
-                        "sell": float(sell_rate),
-                        "updated": datetime.now().isoformat(),
-                    }
-                },
-                upsert=True
-            )
+            storage.update_rate(currency_code, buy_rate, sell_rate, datetime.now().isoformat())
             logging.info(f"✅ Обновлено {currency_code}: {buy_rate}/{sell_rate}")
             return True
         except Exception as e:
@@ -118,12 +122,35 @@ class CurrencyManager:
 
 currency_manager = CurrencyManager()
 
+FIELD_NAMES = {'buy': 'Покупка', 'sell': 'Продажа'}
+
+def notify_scheduled_applied(jobs):
+    """Уведомление авторов о применении запланированных курсов"""
+    for job in jobs:
+        if not job.get('chat_id'):
+            continue
+        try:
+            with tg_client.bulk():
+                bot.send_message(
+                    job['chat_id'],
+                    f"⏰ *Запланированный курс применён*\n\n"
+                    f"`{job['code']}`\n"
+                    f"🏦 Покупка: `{job['buy']:.2f} ₽`\n"
+                    f"💸 Продажа: `{job['sell']:.2f} ₽`",
+                    parse_mode='Markdown'
+                )
+        except Exception as e:
+            logging.error(f"Ошибка уведомления о запланированном курсе: {e}")
+
+scheduler = RateScheduler(storage, on_applied=notify_scheduled_applied)
+
 def is_authorized(user_id):
     """Проверка авторизации пользователя"""
     return authorized_users.get(user_id, False)
 
 def require_auth(func):
     """Декоратор для проверки авторизации"""
+    @wraps(func)
     def wrapper(message):
         if not is_authorized(message.from_user.id):
             bot.send_message(
@@ -172,16 +199,25 @@ def handle_auth(message):
         bot.send_message(message.chat.id, "✅ Вы уже авторизованы!")
         return
     
-    msg = bot.send_message(
+    # Ожидание пароля отмечается до отправки приглашения: ответ может прийти сразу.
+    # register_next_step_handler не подходит: telebot 4.16.1 теряет сообщения,
+    # если в одном getUpdates пришли пароли нескольких пользователей
+    pending_auth.add(message.from_user.id)
+    bot.send_message(
         message.chat.id,
         "🔒 *Авторизация*\n\n"
         "Введите пароль для доступа к управлению курсами:",
         parse_mode='Markdown'
     )
-    bot.register_next_step_handler(msg, process_password)
 
+@bot.message_handler(func=lambda message: message.from_user.id in pending_auth)
 def process_password(message):
     """Обработка ввода пароля"""
+    try:
+        pending_auth.remove(message.from_user.id)
+    except KeyError:
+        return  # пароль уже обработан параллельным обработчиком
+    
     if message.text == BOT_PASSWORD:
         authorized_users[message.from_user.id] = True
         bot.send_message(
@@ -267,9 +303,35 @@ def handle_change_rate(message):
         reply_markup=markup
     )
 
+def render_rate_editor(session):
+    """Текст и клавиатура редактора курса"""
+    text = f"✏️ *Редактирование {session['name']}*\n\n"
+    for field in ('buy', 'sell'):
+        marker = "▶️" if session['field'] == field else "▫️"
+        text += f"{marker} {FIELD_NAMES[field]}: `{session[field] or '—'} ₽`\n"
+    text += "\nНаберите курс на клавиатуре или сдвиньте кнопками ±"
+    
+    markup = types.InlineKeyboardMarkup()
+    for row in (('7', '8', '9'), ('4', '5', '6'), ('1', '2', '3'), ('.', '0', '<')):
+        markup.row(*[
+            types.InlineKeyboardButton('⌫' if key == '<' else key, callback_data=f"k:{key}")
+            for key in row
+        ])
+    markup.row(*[
+        types.InlineKeyboardButton(label, callback_data=f"k:{key}")
+        for label, key in (('−0.10', '-10'), ('−0.05', '-5'), ('+0.05', '+5'), ('+0.10', '+10'))
+    ])
+    other = 'sell' if session['field'] == 'buy' else 'buy'
+    markup.row(types.InlineKeyboardButton(f"↔️ {FIELD_NAMES[other]}", callback_data="k:f"))
+    markup.row(
+        types.InlineKeyboardButton("💾 Сохранить", callback_data="k:ok"),
+        types.InlineKeyboardButton("❌ Отмена", callback_data="cancel")
+    )
+    return text, markup
+
 @bot.callback_query_handler(func=lambda call: call.data.startswith('edit_'))
 def handle_edit_currency(call):
-    """Обработка выбора валюты для редактирования"""
+    """Обработка выбора валюты: сообщение превращается в редактор курса"""
     if not is_authorized(call.from_user.id):
         bot.answer_callback_query(call.id, "❌ Не авторизован!", show_alert=True)
         return
@@ -283,86 +345,192 @@ def handle_edit_currency(call):
         bot.answer_callback_query(call.id, "❌ Валюта не найдена")
         return
     
-    msg = bot.send_message(
+    session = edit_sessions.open(
         call.message.chat.id,
-        f"✏️ *Редактирование {currency_info['name']}*\n\n"
-        f"Введите курс *покупки* (только число, например: 95.5):",
-        parse_mode='Markdown'
+        call.message.message_id,
+        call.from_user.id,
+        code=currency_code,
+        name=currency_info['name'],
+        buy=f"{currency_info.get('buy', 0):.2f}",
+        sell=f"{currency_info.get('sell', 0):.2f}",
+        field='buy',
+        fresh=True
     )
     
-    bot.register_next_step_handler(msg, process_buy_rate, currency_code)
+    text, markup = render_rate_editor(session)
+    bot.edit_message_text(
+        text,
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode='Markdown',
+        reply_markup=markup
+    )
+    bot.answer_callback_query(call.id)
 
-def process_buy_rate(message, currency_code):
-    """Обработка ввода курса покупки"""
-    if not is_authorized(message.from_user.id):
-        bot.send_message(message.chat.id, "❌ Сессия истекла. Авторизуйтесь снова.")
+@bot.callback_query_handler(func=lambda call: call.data.startswith('k:'))
+def handle_keypad(call):
+    """Нажатие клавиши редактора курса"""
+    if not is_authorized(call.from_user.id):
+        bot.answer_callback_query(call.id, "❌ Не авторизован!", show_alert=True)
         return
-        
-    try:
-        buy_rate = float(message.text.replace(',', '.'))
-        
-        if buy_rate <= 0:
-            bot.send_message(message.chat.id, "❌ Курс должен быть больше 0. Попробуйте снова:")
-            bot.register_next_step_handler(message, process_buy_rate, currency_code)
-            return
-        
-        msg = bot.send_message(
-            message.chat.id,
-            f"Теперь введите курс *продажи* (только число, например: 97.8):",
-            parse_mode='Markdown'
-        )
-        
-        bot.register_next_step_handler(msg, process_sell_rate, currency_code, buy_rate)
-        
-    except ValueError:
-        bot.send_message(message.chat.id, "❌ Неверный формат числа. Введите число (например: 95.5):")
-        bot.register_next_step_handler(message, process_buy_rate, currency_code)
-
-def process_sell_rate(message, currency_code, buy_rate):
-    """Обработка ввода курса продажи и сохранение"""
-    if not is_authorized(message.from_user.id):
-        bot.send_message(message.chat.id, "❌ Сессия истекла. Авторизуйтесь снова.")
+    
+    match = KEYPAD_RE.match(call.data)
+    session = edit_sessions.get(call.message.chat.id, call.message.message_id)
+    if not match or not session:
+        bot.answer_callback_query(call.id, "❌ Редактирование устарело. Выберите валюту заново.", show_alert=True)
         return
-        
-    try:
-        sell_rate = float(message.text.replace(',', '.'))
-        
-        if sell_rate <= 0:
-            bot.send_message(message.chat.id, "❌ Курс должен быть больше 0. Попробуйте снова:")
-            bot.register_next_step_handler(message, process_sell_rate, currency_code, buy_rate)
+    if session['user_id'] != call.from_user.id:
+        bot.answer_callback_query(call.id, "❌ Этот редактор открыт другим пользователем", show_alert=True)
+        return
+    
+    # Нажатия одной сессии обрабатываются по очереди, в порядке получения блокировки
+    with session['lock']:
+        if session['closed']:
+            bot.answer_callback_query(call.id, "❌ Редактирование уже завершено", show_alert=True)
             return
         
-        if sell_rate <= buy_rate:
-            bot.send_message(message.chat.id, "❌ Курс продажи должен быть выше курса покупки. Попробуйте снова:")
-            bot.register_next_step_handler(message, process_sell_rate, currency_code, buy_rate)
+        key = match.group(1)
+        if key == 'ok':
+            save_rate_editor(call, session)
             return
         
-        success = currency_manager.update_currency_rate(currency_code, buy_rate, sell_rate)
+        before = render_rate_editor(session)[0]
+        apply_keypad_key(session, key)
+        text, markup = render_rate_editor(session)
         
-        if success:
-            rates = currency_manager.get_current_rates()
-            currency_info = next((c for c in rates if c['code'] == currency_code), None)
-            
-            response = f"✅ *Курсы обновлены!*\n\n"
-            response += f"*{currency_info['name'] if currency_info else currency_code}*\n"
-            response += f"🏦 Покупка: `{buy_rate:.2f} ₽`\n"
-            response += f"💸 Продажа: `{sell_rate:.2f} ₽`\n"
-            response += f"🕐 Обновлено: {datetime.now().strftime('%H:%M')}"
-            
-            bot.send_message(message.chat.id, response, parse_mode='Markdown')
-        else:
-            bot.send_message(message.chat.id, "❌ Ошибка при сохранении курсов в базу данных")
-            
-    except ValueError:
-        bot.send_message(message.chat.id, "❌ Неверный формат числа. Введите число (например: 97.8):")
-        bot.register_next_step_handler(message, process_sell_rate, currency_code, buy_rate)
+        # Без изменений Telegram отвечает ошибкой "message is not modified"
+        if text != before:
+            bot.edit_message_text(
+                text,
+                call.message.chat.id,
+                call.message.message_id,
+                parse_mode='Markdown',
+                reply_markup=markup
+            )
+    bot.answer_callback_query(call.id)
+
+def save_rate_editor(call, session):
+    """Проверка и сохранение курсов из редактора"""
+    try:
+        buy_rate, sell_rate = validate_rates(session['buy'], session['sell'])
+    except ValueError as e:
+        bot.answer_callback_query(call.id, f"❌ {e}", show_alert=True)
+        return
+    
+    if not currency_manager.update_currency_rate(session['code'], buy_rate, sell_rate):
+        bot.answer_callback_query(call.id, "❌ Ошибка при сохранении курсов в базу данных", show_alert=True)
+        return
+    
+    edit_sessions.close(call.message.chat.id, call.message.message_id)
+    
+    response = f"✅ *Курсы обновлены!*\n\n"
+    response += f"*{session['name']}*\n"
+    response += f"🏦 Покупка: `{buy_rate:.2f} ₽`\n"
+    response += f"💸 Продажа: `{sell_rate:.2f} ₽`\n"
+    response += f"🕐 Обновлено: {datetime.now().strftime('%H:%M')}"
+    
+    bot.edit_message_text(response, call.message.chat.id, call.message.message_id, parse_mode='Markdown')
+    bot.answer_callback_query(call.id, "Курсы обновлены")
 
 @bot.callback_query_handler(func=lambda call: call.data == 'cancel')
 def handle_cancel(call):
     """Обработка отмены"""
+    session = edit_sessions.get(call.message.chat.id, call.message.message_id)
+    if session and session['user_id'] != call.from_user.id:
+        bot.answer_callback_query(call.id, "❌ Этот редактор открыт другим пользователем", show_alert=True)
+        return
+    edit_sessions.close(call.message.chat.id, call.message.message_id)
     bot.delete_message(call.message.chat.id, call.message.message_id)
     bot.answer_callback_query(call.id, "Действие отменено")
 
+def format_scheduled_jobs(jobs):
+    """Текст и клавиатура со списком запланированных изменений"""
+    if not jobs:
+        return "⏰ Запланированных изменений нет", None
+    
+    response = "⏰ *Запланированные изменения:*\n\n"
+    markup = types.InlineKeyboardMarkup(row_width=1)
+    for job in jobs:
+        run_at = datetime.fromisoformat(job['run_at']).strftime('%d.%m %H:%M')
+        response += f"`{job['code']}` — {run_at}\n"
+        response += f"   Покупка: `{job['buy']:.2f} ₽` / Продажа: `{job['sell']:.2f} ₽`\n\n"
+        markup.add(types.InlineKeyboardButton(
+            text=f"❌ {job['code']} {run_at}",
+            callback_data=f"unsched_{job['id']}"
+        ))
+    return response, markup
+
+@bot.message_handler(commands=['schedule'])
+@require_auth
+def handle_schedule(message):
+    """Планирование изменения курса: /schedule КОД ПОКУПКА ПРОДАЖА ЧЧ:ММ"""
+    parts = message.text.split()
+    if len(parts) != 5:
+        bot.send_message(
+            message.chat.id,
+            "⏰ *Планирование курса*\n\n"
+            "Формат: `/schedule USD_BLUE 81.5 82.2 09:00`",
+            parse_mode='Markdown'
+        )
+        return
+    
+    _, currency_code, buy, sell, at = parts
+    try:
+        job = scheduler.schedule(
+            currency_code.upper(),
+            buy.replace(',', '.'),
+            sell.replace(',', '.'),
+            parse_run_at(at),
+            source='bot',
+            chat_id=message.chat.id
+        )
+    except ValueError as e:
+        bot.send_message(message.chat.id, f"❌ {e}")
+        return
+    except Exception as e:
+        logging.error(f"Ошибка планирования курса: {e}")
+        bot.send_message(message.chat.id, "❌ Ошибка при сохранении в базу данных")
+        return
+    
+    run_at = datetime.fromisoformat(job['run_at']).strftime('%d.%m %H:%M')
+    bot.send_message(
+        message.chat.id,
+        f"⏰ *Изменение запланировано*\n\n"
+        f"`{job['code']}` — {run_at}\n"
+        f"🏦 Покупка: `{job['buy']:.2f} ₽`\n"
+        f"💸 Продажа: `{job['sell']:.2f} ₽`\n\n"
+        "Список и отмена: /scheduled",
+        parse_mode='Markdown'
+    )
+
+@bot.message_handler(commands=['scheduled'])
+@require_auth
+def handle_scheduled(message):
+    """Список запланированных изменений"""
+    response, markup = format_scheduled_jobs(scheduler.pending())
+    bot.send_message(message.chat.id, response, parse_mode='Markdown', reply_markup=markup)
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('unsched_'))
+def handle_unschedule(call):
+    """Отмена запланированного изменения"""
+    if not is_authorized(call.from_user.id):
+        bot.answer_callback_query(call.id, "❌ Не авторизован!", show_alert=True)
+        return
+    
+    if scheduler.cancel(call.data.replace('unsched_', '')):
+        bot.answer_callback_query(call.id, "Изменение отменено")
+    else:
+        bot.answer_callback_query(call.id, "❌ Изменение уже применено или отменено")
+    
+    response, markup = format_scheduled_jobs(scheduler.pending())
+    bot.edit_message_text(
+        response,
+        call.message.chat.id,
+        call.message.message_id,
+        parse_mode='Markdown',
+        reply_markup=markup
+    )
+
 @bot.message_handler(func=lambda message: message.text == '🔄 Обновить все')
 @require_auth
 def handle_update_all(message):
@@ -379,6 +547,8 @@ def send_help(message):
 */start* - Главное меню
 */rates* - Текущие курсы
 */auth* - Авторизация
+*/schedule* - Запланировать курс: `/schedule USD_BLUE 81.5 82.2 09:00`
+*/scheduled* - Запланированные изменения и их отмена
 */help* - Эта справка
 
 *Быстрые кнопки:*
@@ -393,9 +563,9 @@ def send_help(message):
 1. Нажмите *"🔐 Авторизация"* и введите пароль
 2. Нажмите *"✏️ Изменить курс"*
 3. Выберите валюту из списка
-4. Введите курс покупки
-5. Введите курс продажи
-6. Курсы автоматически обновятся на сайте
+4. Наберите курс покупки на клавиатуре под сообщением
+5. Переключитесь на продажу (↔️) и наберите курс продажи
+6. Нажмите 💾 Сохранить — курсы обновятся на сайте
 
 *Примечание:* Курс продажи должен быть выше курса покупки.
 """
@@ -416,11 +586,19 @@ def signal_handler(sig, frame):
     bot.stop_polling()
     sys.exit(0)
 
-def keep_alive():
-    """Функция для поддержания активности бота"""
-    while True:
-        logging.info("🤖 Бот активен...")
-        time.sleep(500)
+def restart_on_stall():
+    """Контролируемый перезапуск: ненулевой код выхода перезапустит сервис (Railway ON_FAILURE)"""
+    try:
+        bot.stop_polling()
+    finally:
+        os._exit(1)
+
+watchdog = BotWatchdog(
+    ping=storage.ping,
+    stall_timeout=POLL_STALL_TIMEOUT,
+    on_stall=restart_on_stall
+)
+watchdog.install(bot)
 
 if __name__ == "__main__":
     signal.signal(signal.SIGINT, signal_handler)
@@ -434,8 +612,9 @@ if __name__ == "__main__":
     except Exception as e:
         logging.error(f"❌ Не удалось загрузить валюты: {e}")
     
-    keep_alive_thread = Thread(target=keep_alive, daemon=True)
-    keep_alive_thread.start()
+    scheduler.start()
+    
+    watchdog.start(HEALTH_HOST, HEALTH_PORT)
     
     try:
         bot.infinity_polling(timeout=60, long_polling_timeout=60)
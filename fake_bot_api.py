@@ -0,0 +1,209 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+def load_updates(path):
+    """Обновления из записи сервера (JSONL): список (смещение в секундах, update)"""
+    updates = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry.get('type') == 'update':
+                updates.append((entry['t'], entry['update']))
+    return updates
+
+
+class FakeBotAPI:
+    """Локальный сервер Bot API для замеров без обращения к Telegram.
+
+    Отдаёт в getUpdates обновления, добавленные через push_update() (по
+    сценарию или из записи), и записывает все исходящие вызовы бота. Может
+    имитировать ограничения Telegram: доля ответов 429 (с retry_after), доля
+    5xx и задержка ответа. С record_path всё взаимодействие пишется в JSONL,
+    который потом можно воспроизвести через load_updates().
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, rate_429=0.0, rate_5xx=0.0, retry_after=1, latency=0.0,
+                 record_path=None):
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+        self.latency = latency
+        self.calls = []
+        self.started = time.time()
+        self._updates = []
+        self._update_id = 0
+        self._delivered = 0
+        self._message_ids = {}  # message_id ведётся по чатам, чтобы воспроизведение было детерминированным
+        self._callback_chats = {}
+        self._cond = threading.Condition()
+        self._record = open(record_path, 'w', encoding='utf-8') if record_path else None
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name="fake-bot-api", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._record:
+            self._record.close()
+
+    def _write(self, entry):
+        if self._record:
+            entry['t'] = round(time.time() - self.started, 4)
+            self._record.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._record.flush()
+
+    def push_update(self, update):
+        """Добавить обновление в очередь getUpdates, возвращает update_id"""
+        with self._cond:
+            self._update_id += 1
+            update = dict(update, update_id=self._update_id)
+            if 'callback_query' in update:
+                query = update['callback_query']
+                self._callback_chats[str(query['id'])] = query['message']['chat']['id']
+            self._updates.append(update)
+            self._write({'type': 'update', 'update': update})
+            self._cond.notify_all()
+            return self._update_id
+
+    def pending_updates(self):
+        with self._cond:
+            return len(self._updates)
+
+    @property
+    def delivered(self):
+        return self._delivered
+
+    def calls_by_method(self):
+        counts = {}
+        for call in self.calls:
+            counts[call['method']] = counts.get(call['method'], 0) + 1
+        return counts
+
+    def calls_for(self, chat_id, since=0):
+        """Исходящие вызовы для чата начиная с индекса since в self.calls"""
+        with self._cond:
+            return [c for c in self.calls[since:] if c['chat_id'] == chat_id]
+
+    def wait_for(self, chat_id, expected, since=0, timeout=10):
+        """Ждать вызовов для чата: expected = {метод: количество}; False по таймауту"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                counts = {}
+                for call in self.calls[since:]:
+                    if call['chat_id'] == chat_id:
+                        counts[call['method']] = counts.get(call['method'], 0) + 1
+                if all(counts.get(m, 0) >= n for m, n in expected.items()):
+                    return True
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+
+    def handle(self, method, params):
+        """Ответ на вызов метода: (HTTP-статус, тело)"""
+        if method == 'getUpdates':
+            return 200, {"ok": True, "result": self._get_updates(params)}
+
+        if self.latency:
+            time.sleep(self.latency)
+        roll = random.random()
+        if roll < self.rate_429:
+            return 429, {
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+        if roll < self.rate_429 + self.rate_5xx:
+            return 502, {"ok": False, "error_code": 502, "description": "Bad Gateway"}
+
+        with self._cond:
+            if method in ('sendMessage', 'editMessageText', 'editMessageReplyMarkup'):
+                result = self._message(params)
+            elif method == 'getMe':
+                result = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+            else:
+                result = True
+            chat_id = params.get('chat_id') or self._callback_chats.get(str(params.get('callback_query_id')))
+            call = {
+                "method": method,
+                "chat_id": int(chat_id) if chat_id is not None else None,
+                "params": params,
+                "result": result,
+                "time": time.time(),
+            }
+            self.calls.append(call)
+            self._write({'type': 'call', 'method': method, 'params': params})
+            self._cond.notify_all()
+        return 200, {"ok": True, "result": result}
+
+    def _get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        deadline = time.time() + float(params.get('timeout') or 0)
+        with self._cond:
+            # Обновления до offset подтверждены ботом
+            self._updates = [u for u in self._updates if u['update_id'] >= offset]
+            while not self._updates and time.time() < deadline:
+                self._cond.wait(deadline - time.time())
+            limit = int(params.get('limit') or 100)
+            result = self._updates[:limit]
+            self._delivered = max(self._delivered, result[-1]['update_id'] if result else 0)
+            return result
+
+    def _message(self, params):
+        chat_id = int(params.get('chat_id', 0))
+        message_id = params.get('message_id')
+        if not message_id:
+            message_id = self._message_ids[chat_id] = self._message_ids.get(chat_id, 0) + 1
+        return {
+            "message_id": int(message_id),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "FakeBot"},
+            "text": params.get('text', ''),
+        }
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _dispatch(self):
+                parts = urlsplit(self.path)
+                params = dict(parse_qsl(parts.query))
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    body = self.rfile.read(length).decode('utf-8')
+                    if self.headers.get('Content-Type', '').startswith('application/json'):
+                        params.update(json.loads(body))
+                    else:
+                        params.update(parse_qsl(body))
+                method = parts.path.rsplit('/', 1)[-1]
+                status, payload = api.handle(method, params)
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _dispatch
+            do_POST = _dispatch
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
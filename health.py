@@ -0,0 +1,170 @@
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class BotWatchdog:
+    """Контроль живости бота: опрос getUpdates, обработчики и хранилище.
+
+    Поток проверки раз в check_interval секунд пингует хранилище и смотрит, когда
+    последний раз успешно завершился getUpdates. Если опрос молчит дольше
+    stall_timeout, вызывается on_stall (перезапуск процесса).
+    Состояние отдаётся по HTTP: /health (живость) и /ready (готовность).
+    """
+
+    def __init__(self, ping=None, stall_timeout=300, check_interval=30, log_interval=500, on_stall=None):
+        self.ping = ping
+        self.stall_timeout = stall_timeout
+        self.check_interval = check_interval
+        self.log_interval = log_interval
+        self.on_stall = on_stall
+        self.started = time.monotonic()
+        self.last_poll_ok = None
+        self.last_poll_error = None
+        self.poll_errors = 0
+        self.storage_ok = None
+        self.storage_latency_ms = None
+        self.storage_error = None
+        self.handled = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def install(self, bot):
+        """Подключение к экземпляру TeleBot"""
+        get_updates = bot.get_updates
+
+        def tracked_get_updates(*args, **kwargs):
+            try:
+                updates = get_updates(*args, **kwargs)
+            except Exception as e:
+                self.poll_errors += 1
+                self.last_poll_error = str(e)
+                raise
+            self.last_poll_ok = time.monotonic()
+            return updates
+
+        # infinity_polling вызывает get_updates и _exec_task через атрибуты
+        # экземпляра, поэтому достаточно подменить их у самого бота
+        bot.get_updates = tracked_get_updates
+        exec_task = bot._exec_task
+        bot._exec_task = lambda task, *args, **kwargs: exec_task(self.track(task), *args, **kwargs)
+
+    def track(self, task):
+        """Обёртка обработчика для учёта выполняющихся задач"""
+        name = getattr(task, '__name__', repr(task))
+
+        def tracked(*args, **kwargs):
+            token = object()
+            with self._lock:
+                self._inflight[token] = (name, time.monotonic())
+            try:
+                return task(*args, **kwargs)
+            finally:
+                with self._lock:
+                    del self._inflight[token]
+                    self.handled += 1
+
+        return tracked
+
+    def since_last_poll(self):
+        return time.monotonic() - (self.last_poll_ok or self.started)
+
+    def is_stalled(self):
+        return self.since_last_poll() > self.stall_timeout
+
+    def status(self):
+        now = time.monotonic()
+        with self._lock:
+            inflight = list(self._inflight.values())
+        longest = max(inflight, key=lambda h: now - h[1], default=None)
+        return {
+            "alive": not self.is_stalled(),
+            "ready": not self.is_stalled() and bool(self.storage_ok) and self.last_poll_ok is not None,
+            "time": datetime.utcnow().isoformat(),
+            "uptime": round(now - self.started, 1),
+            "polling": {
+                "since_last_ok": round(self.since_last_poll(), 1),
+                "received": self.last_poll_ok is not None,
+                "errors": self.poll_errors,
+                "last_error": self.last_poll_error,
+                "stall_timeout": self.stall_timeout,
+            },
+            "handlers": {
+                "inflight": len(inflight),
+                "handled": self.handled,
+                "longest": {"name": longest[0], "seconds": round(now - longest[1], 1)} if longest else None,
+            },
+            "storage": {
+                "ok": self.storage_ok,
+                "latency_ms": self.storage_latency_ms,
+                "error": self.storage_error,
+            },
+        }
+
+    def check_storage(self):
+        if not self.ping:
+            return
+        start = time.perf_counter()
+        try:
+            self.ping()
+            self.storage_latency_ms = round((time.perf_counter() - start) * 1000, 1)
+            self.storage_ok = True
+            self.storage_error = None
+        except Exception as e:
+            self.storage_ok = False
+            self.storage_error = str(e)
+            logging.error(f"❌ Хранилище не отвечает: {e}")
+
+    def _run(self):
+        last_log = 0
+        while True:
+            self.check_storage()
+            if self.is_stalled():
+                logging.error(f"❌ Нет успешного getUpdates {self.since_last_poll():.0f} с — перезапуск")
+                if self.on_stall:
+                    self.on_stall()
+            elif time.monotonic() - last_log >= self.log_interval:
+                status = self.status()
+                logging.info(
+                    f"🤖 Бот активен: опрос {status['polling']['since_last_ok']} с назад, "
+                    f"обработчиков {status['handlers']['inflight']}, "
+                    f"хранилище {self.storage_latency_ms} мс"
+                )
+                last_log = time.monotonic()
+            time.sleep(self.check_interval)
+
+    def start(self, host='127.0.0.1', port=8080):
+        """Запуск потока проверки и HTTP-сервера состояния"""
+        self.started = time.monotonic()
+        threading.Thread(target=self._run, name="watchdog", daemon=True).start()
+
+        watchdog = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status = watchdog.status()
+                if self.path == '/health':
+                    ok = status['alive']
+                elif self.path == '/ready':
+                    ok = status['ready']
+                else:
+                    self.send_error(404)
+                    return
+                body = json.dumps(status, ensure_ascii=False).encode('utf-8')
+                self.send_response(200 if ok else 503)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="health-http", daemon=True).start()
+        logging.info(f"🩺 Эндпоинт состояния: http://{host}:{port}/health")
@@ -0,0 +1,85 @@
+import re
+import threading
+import time
+
+KEYPAD_RE = re.compile(r'^k:([0-9.<f]|[+-](?:5|10)|ok)$')
+
+
+def apply_keypad_key(session, key):
+    """Изменение значения активного поля по нажатой клавише"""
+    field = session['field']
+    value = session[field]
+
+    if key == 'f':
+        session['field'] = 'sell' if field == 'buy' else 'buy'
+        session['fresh'] = True
+        return
+
+    if key[0] in '+-':
+        try:
+            current = float(value) if value else 0.0
+        except ValueError:
+            current = 0.0
+        session[field] = f"{max(current + int(key) / 100, 0.0):.2f}"
+        session['fresh'] = True
+        return
+
+    if session['fresh']:
+        value = ''
+        session['fresh'] = False
+
+    if key == '<':
+        value = value[:-1]
+    elif key == '.':
+        if '.' not in value:
+            value = (value or '0') + '.'
+    elif len(value) < 8 and not ('.' in value and len(value.split('.')[1]) >= 4):
+        value = value + key if value != '0' else key
+    session[field] = value
+
+
+class EditSessions:
+    """Открытые редакторы курса по (chat_id, message_id).
+
+    Сессия принадлежит пользователю, открывшему редактор, и живёт ttl секунд
+    с последнего нажатия. Нажатия обрабатываются пулом потоков бота, поэтому
+    изменения одной сессии выполняются под её блокировкой (session['lock']);
+    после закрытия сессия помечается 'closed' и опоздавшие нажатия игнорируются.
+    """
+
+    def __init__(self, ttl=900):
+        self.ttl = ttl
+        self._items = {}
+        self._lock = threading.Lock()
+
+    def open(self, chat_id, message_id, user_id, **state):
+        session = dict(state, user_id=user_id, lock=threading.Lock(), closed=False, touched=time.monotonic())
+        with self._lock:
+            self._expire()
+            self._items[(chat_id, message_id)] = session
+        return session
+
+    def get(self, chat_id, message_id):
+        """Сессия редактора или None, если её нет или она устарела"""
+        with self._lock:
+            self._expire()
+            session = self._items.get((chat_id, message_id))
+            if session:
+                session['touched'] = time.monotonic()
+            return session
+
+    def close(self, chat_id, message_id):
+        with self._lock:
+            session = self._items.pop((chat_id, message_id), None)
+        if session:
+            session['closed'] = True
+        return session
+
+    def _expire(self):
+        deadline = time.monotonic() - self.ttl
+        for key in [k for k, s in self._items.items() if s['touched'] < deadline]:
+            self._items.pop(key)['closed'] = True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
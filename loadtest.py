@@ -0,0 +1,232 @@
+"""Нагрузочный тест обработчиков bot.py на локальном фейковом Bot API.
+
+Бот запускается в этом же процессе с курсами в SQLite в памяти
+и опрашивает FakeBotAPI. Виртуальные пользователи параллельно проходят
+сценарии: авторизация и несколько правок курса через клавиатуру или просмотр
+курсов. В конце печатается отчёт: обновлений в секунду, задержки сценариев
+и число исходящих вызовов API на сценарий. Если бот не ответил вовремя
+хотя бы на один шаг, процесс завершается с кодом 1.
+
+Примеры:
+    python loadtest.py --users 50 --editors 0.2 --iterations 5
+    python loadtest.py --users 10 --record traffic.jsonl
+    python loadtest.py --replay traffic.jsonl --speed 0
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+from fake_bot_api import FakeBotAPI, load_updates
+
+PASSWORD = 'loadtest'
+EDITABLE = ['USD_BLUE', 'USD_WHITE', 'EUR']
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return round(samples[min(len(samples) - 1, int(len(samples) * q))] * 1000, 1)
+
+
+class VirtualUser:
+    """Пользователь Telegram, который шлёт обновления и ждёт ответов бота"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, server, user_id, timeout):
+        self.server = server
+        self.user_id = user_id
+        self.timeout = timeout
+        self.steps = []
+        self.failed = 0
+        self._message_id = 0
+
+    def _user(self):
+        return {"id": self.user_id, "is_bot": False, "first_name": f"User{self.user_id}"}
+
+    def _chat(self):
+        return {"id": self.user_id, "type": "private"}
+
+    def _step(self, update, expected):
+        since = len(self.server.calls)
+        start = time.perf_counter()
+        self.server.push_update(update)
+        if not self.server.wait_for(self.user_id, expected, since, self.timeout):
+            self.failed += 1
+        self.steps.append(time.perf_counter() - start)
+        return self.server.calls_for(self.user_id, since)
+
+    def send(self, text, expected=None):
+        self._message_id += 1
+        return self._step({"message": {
+            "message_id": self._message_id,
+            "from": self._user(),
+            "chat": self._chat(),
+            "date": int(time.time()),
+            "text": text,
+        }}, expected or {'sendMessage': 1})
+
+    def press(self, message, data, expected=None):
+        return self._step({"callback_query": {
+            "id": str(next(self._ids)),
+            "from": self._user(),
+            "message": message,
+            "chat_instance": str(self.user_id),
+            "data": data,
+        }}, expected or {'editMessageText': 1, 'answerCallbackQuery': 1})
+
+
+def flow_rates(user):
+    user.send('/rates')
+
+
+def flow_auth_edit(user, edits):
+    user.send('/start')
+    user.send('/auth')
+    user.send(PASSWORD, {'sendMessage': 2})
+    for _ in range(edits):
+        calls = user.send('✏️ Изменить курс')
+        message = next(c['result'] for c in reversed(calls) if c['method'] == 'sendMessage')
+        user.press(message, f"edit_{random.choice(EDITABLE)}")
+        buy = round(random.uniform(80, 99), 2)
+        for field, value in (('buy', buy), ('sell', buy + 0.7)):
+            if field == 'sell':
+                user.press(message, 'k:f')
+            for key in f"{value:.2f}":
+                user.press(message, f"k:{key}")
+        user.press(message, 'k:ok')
+    user.send('🚪 Выйти', {'sendMessage': 2})
+
+
+def run_users(server, args):
+    results = {'rates': [], 'auth_edit': []}
+    lock = threading.Lock()
+    editors = int(args.users * args.editors)
+
+    def worker(index):
+        user = VirtualUser(server, 100000 + index, args.timeout)
+        kind = 'auth_edit' if index < editors else 'rates'
+        for _ in range(args.iterations):
+            since = len(server.calls)
+            start = time.perf_counter()
+            steps = len(user.steps)
+            if kind == 'auth_edit':
+                flow_auth_edit(user, args.edits)
+            else:
+                flow_rates(user)
+            elapsed = time.perf_counter() - start
+            calls = len(server.calls_for(user.user_id, since))
+            with lock:
+                results[kind].append({
+                    'seconds': elapsed,
+                    'calls': calls,
+                    'updates': len(user.steps) - steps,
+                    'steps': user.steps[steps:],
+                })
+            if args.think:
+                time.sleep(random.uniform(0, args.think))
+        return user
+
+    users = []
+    threads = []
+    for i in range(args.users):
+        t = threading.Thread(target=lambda i=i: users.append(worker(i)))
+        threads.append(t)
+        t.start()
+    for t in threads:
+        t.join()
+    return results, sum(u.failed for u in users)
+
+
+def run_replay(server, args):
+    updates = load_updates(args.replay)
+    start = time.perf_counter()
+    for offset, update in updates:
+        if args.speed:
+            delay = offset / args.speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        update.pop('update_id', None)
+        server.push_update(update)
+    # Ждём, пока бот заберёт все обновления и перестанет отвечать
+    last = -1
+    while server.pending_updates() or len(server.calls) != last:
+        last = len(server.calls)
+        time.sleep(1)
+    return len(updates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20, help='виртуальных пользователей')
+    parser.add_argument('--editors', type=float, default=0.25, help='доля пользователей, меняющих курсы')
+    parser.add_argument('--iterations', type=int, default=3, help='сценариев на пользователя')
+    parser.add_argument('--edits', type=int, default=2, help='правок курса за сценарий')
+    parser.add_argument('--think', type=float, default=0.0, help='пауза между сценариями, с')
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка фейкового API, с')
+    parser.add_argument('--timeout', type=float, default=15, help='ожидание ответа бота, с')
+    parser.add_argument('--record', help='записать трафик в JSONL')
+    parser.add_argument('--replay', help='воспроизвести записанные обновления')
+    parser.add_argument('--speed', type=float, default=1.0, help='скорость воспроизведения, 0 — без пауз')
+    args = parser.parse_args()
+
+    server = FakeBotAPI(latency=args.latency, record_path=args.record).start()
+    os.environ.update({
+        'TELEGRAM_TOKEN': '123456:LOADTEST',
+        'BOT_PASSWORD': PASSWORD,
+        'STORAGE_BACKEND': 'sqlite',
+        'SQLITE_PATH': ':memory:',
+        'TELEGRAM_API_URL': server.url,
+    })
+    import bot  # окружение должно быть настроено до импорта
+    logging.getLogger().setLevel(logging.WARNING)
+    bot.currency_manager.get_current_rates()
+    threading.Thread(
+        target=bot.bot.infinity_polling,
+        kwargs={'timeout': 10, 'long_polling_timeout': 1},
+        daemon=True
+    ).start()
+
+    start = time.perf_counter()
+    report = {}
+    if args.replay:
+        report['updates'] = run_replay(server, args)
+    else:
+        results, failed = run_users(server, args)
+        report['updates'] = sum(r['updates'] for flows in results.values() for r in flows)
+        report['timeouts'] = failed
+        for kind, flows in results.items():
+            if not flows:
+                continue
+            steps = [s for r in flows for s in r['steps']]
+            report[kind] = {
+                'flows': len(flows),
+                'flow_p50_ms': percentile([r['seconds'] for r in flows], 0.5),
+                'flow_p95_ms': percentile([r['seconds'] for r in flows], 0.95),
+                'step_p50_ms': percentile(steps, 0.5),
+                'step_p95_ms': percentile(steps, 0.95),
+                'api_calls_per_flow': round(sum(r['calls'] for r in flows) / len(flows), 1),
+            }
+    elapsed = time.perf_counter() - start
+    report['elapsed_s'] = round(elapsed, 2)
+    report['updates_per_s'] = round(report['updates'] / elapsed, 1)
+    report['api_calls'] = server.calls_by_method()
+    report['client'] = bot.tg_client.stats()
+
+    bot.bot.stop_polling()
+    server.stop()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if report.get('timeouts'):
+        logging.error(f"❌ Бот не ответил вовремя на {report['timeouts']} шагов, замер недостоверен")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
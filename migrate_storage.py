@@ -0,0 +1,57 @@
+"""Перенос курсов и ожидающих изменений между хранилищами.
+
+Пример: python migrate_storage.py --from mongo --to sqlite --sqlite-path /opt/oper-kassa-bot/operkassa.db
+Подключение берётся из MONGO_URI / SQLITE_PATH, если не задано аргументами.
+"""
+import argparse
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from storage import create_backend
+
+
+def migrate(source, target, jobs=True):
+    """Полная замена курсов в target и перенос ожидающих заданий"""
+    rates = source.list_rates()
+    if not rates:
+        raise ValueError("В исходном хранилище нет курсов")
+    target.replace_rates(rates)
+
+    moved = 0
+    if jobs:
+        existing = {(j["code"], j["run_at"], j["buy"], j["sell"]) for j in target.pending_jobs()}
+        for job in source.pending_jobs():
+            if (job["code"], job["run_at"], job["buy"], job["sell"]) in existing:
+                continue
+            target.add_job({k: v for k, v in job.items() if k != "id"})
+            moved += 1
+    return len(rates), moved
+
+
+def main():
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--from', dest='source', choices=['mongo', 'sqlite'], required=True)
+    parser.add_argument('--to', dest='target', choices=['mongo', 'sqlite'], required=True)
+    parser.add_argument('--mongo-uri', default=os.getenv("MONGO_URI"))
+    parser.add_argument('--sqlite-path', default=os.getenv("SQLITE_PATH"))
+    parser.add_argument('--no-jobs', action='store_true', help='не переносить запланированные изменения')
+    args = parser.parse_args()
+
+    if args.source == args.target:
+        parser.error("Исходное и целевое хранилища совпадают")
+
+    source = create_backend(args.source, mongo_uri=args.mongo_uri, sqlite_path=args.sqlite_path)
+    target = create_backend(args.target, mongo_uri=args.mongo_uri, sqlite_path=args.sqlite_path)
+    rates, jobs = migrate(source, target, jobs=not args.no_jobs)
+    logging.info(f"✅ Перенесено из {source.name} в {target.name}: валют {rates}, заданий {jobs}")
+    source.close()
+    target.close()
+
+
+if __name__ == '__main__':
+    main()
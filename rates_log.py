@@ -0,0 +1,100 @@
+import threading
+import time
+import uuid
+from collections import deque
+
+# Поля компактного (массивного) представления для табло с узким каналом
+COMPACT_FIELDS = ["code", "name", "flag", "showRates", "buy", "sell", "updated"]
+
+
+class RateChangeLog:
+    """Журнал изменений курсов в памяти для дельта-синхронизации.
+
+    Каждое изменение валюты получает новую версию вида '<эпоха>-<номер>'.
+    Журнал ограничен max_entries записями: клиенту с более старой версией
+    отдаётся полный снимок. Эпоха случайна для каждого экземпляра журнала,
+    поэтому версия от другого процесса (перезапуск, несколько воркеров
+    за балансировщиком) не совпадёт по эпохе и тоже даст полный снимок.
+    """
+
+    def __init__(self, loader, max_entries=256, max_age=1.0):
+        self.loader = loader
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.oldest = 0
+        self._entries = deque()  # (version, code, doc или None для удалённых)
+        self._snapshot = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """Перечитать курсы, если снимок старше max_age, и записать отличия"""
+        with self._lock:
+            if not force and self._loaded_at and time.monotonic() - self._loaded_at < self.max_age:
+                return self.version
+            docs = self.loader()
+            # Пустое хранилище — тоже загруженный снимок: появление валют пойдёт в журнал
+            first_load = self._loaded_at is None
+            self._loaded_at = time.monotonic()
+            current = {doc["code"]: doc for doc in docs}
+
+            changed = [code for code, doc in current.items() if self._snapshot.get(code) != doc]
+            removed = [code for code in self._snapshot if code not in current]
+            self._snapshot = current
+            if first_load:
+                return self.version
+            for code in changed:
+                self._append(code, current[code])
+            for code in removed:
+                self._append(code, None)
+            return self.version
+
+    @property
+    def version(self):
+        return f"{self.epoch}-{self.seq}"
+
+    def _append(self, code, doc):
+        self.seq += 1
+        self._entries.append((self.seq, code, doc))
+        if len(self._entries) > self.max_entries:
+            self.oldest = self._entries.popleft()[0]
+
+    def snapshot(self):
+        """Текущая версия и список всех валют"""
+        with self._lock:
+            return self.version, list(self._snapshot.values())
+
+    def changes_since(self, since):
+        """Изменения после версии since: (version, full, currencies, removed)"""
+        epoch, seq = parse_version(since) if since is not None else (None, None)
+        with self._lock:
+            if epoch != self.epoch or seq < self.oldest or seq > self.seq:
+                return self.version, True, list(self._snapshot.values()), []
+            latest = {}
+            for version, code, doc in self._entries:
+                if version > seq:
+                    latest[code] = doc
+            currencies = [doc for doc in latest.values() if doc is not None]
+            removed = [code for code, doc in latest.items() if doc is None]
+            return self.version, False, currencies, removed
+
+
+def parse_version(value):
+    """Разбор версии '<эпоха>-<номер>' в (эпоха, номер); ValueError при неверном формате"""
+    epoch, sep, seq = str(value).rpartition("-")
+    if not sep or not epoch or not seq.isdigit():
+        raise ValueError(f"Неверная версия: {value}")
+    return epoch, int(seq)
+
+
+def compact(version, full, currencies, removed):
+    """Компактное представление: строки-массивы вместо объектов"""
+    return {
+        "v": version,
+        "full": int(full),
+        "fields": COMPACT_FIELDS,
+        "rows": [[doc.get(f) for f in COMPACT_FIELDS] for doc in currencies],
+        "removed": removed,
+    }
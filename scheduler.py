@@ -0,0 +1,225 @@
+import heapq
+import logging
+import math
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+# Максимальный сон планировщика: часы могут быть переведены, поэтому
+# время ближайшего задания периодически пересчитывается (без запросов к БД)
+MAX_SLEEP_SECONDS = 60
+
+# Задание в статусе running дольше этого срока считается брошенным
+# (процесс упал между захватом и записью курсов) и возвращается в ожидание
+CLAIM_TIMEOUT_SECONDS = 300
+
+# Служебная запись кучи: повторная проверка брошенных заданий после старта
+RECOVER = "recover"
+
+
+def parse_run_at(value, now=None):
+    """Разбор времени применения: 'ЧЧ:ММ' (ближайшее) или ISO-дата"""
+    now = now or datetime.now()
+    value = (value or "").strip()
+    try:
+        t = datetime.strptime(value, "%H:%M")
+    except ValueError:
+        try:
+            run_at = datetime.fromisoformat(value).replace(microsecond=0)
+        except ValueError:
+            raise ValueError("Неверный формат времени. Используйте ЧЧ:ММ или ГГГГ-ММ-ДДTЧЧ:ММ")
+        # Время со смещением переводится в локальное: задания хранятся без зоны
+        if run_at.tzinfo:
+            run_at = run_at.astimezone().replace(tzinfo=None)
+        return run_at
+    run_at = now.replace(hour=t.hour, minute=t.minute, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return run_at
+
+
+def validate_rates(buy, sell):
+    """Проверка пары курсов, возвращает (buy, sell) как float"""
+    try:
+        buy, sell = float(buy), float(sell)
+    except (TypeError, ValueError):
+        raise ValueError("Неверный формат числа")
+    # float() принимает 'nan' и 'inf', которые проходят сравнения ниже
+    if not (math.isfinite(buy) and math.isfinite(sell)):
+        raise ValueError("Неверный формат числа")
+    if buy <= 0 or sell <= 0:
+        raise ValueError("Курс должен быть больше 0")
+    if sell <= buy:
+        raise ValueError("Курс продажи должен быть выше курса покупки")
+    return buy, sell
+
+
+def public_job(job):
+    """Представление задания для клиентов (бот, панель, API)"""
+    return {
+        "id": job["id"],
+        "code": job["code"],
+        "buy": job["buy"],
+        "sell": job["sell"],
+        "run_at": job["run_at"],
+        "status": job.get("status"),
+        "source": job.get("source"),
+    }
+
+
+class RateScheduler:
+    """Отложенные изменения курсов на одном потоке с кучей таймеров.
+
+    Задания хранятся в storage.RatesBackend и загружаются заново при старте.
+    Поток спит до ближайшего задания, а все задания, ставшие готовыми,
+    применяются одной пакетной записью. Несколько процессов (бот и API) могут работать
+    одновременно: задание захватывается атомарно, поэтому применяется один раз.
+    Задания, захваченные упавшим процессом, возвращаются в ожидание при старте
+    и ещё раз через CLAIM_TIMEOUT_SECONDS.
+    """
+
+    def __init__(self, storage, on_applied=None):
+        self.storage = storage
+        self.on_applied = on_applied
+        self.instance_id = uuid.uuid4().hex
+        self._heap = []  # (run_at, job_id)
+        self._cancelled = set()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        """Загрузка ожидающих заданий и запуск потока планировщика"""
+        if self._thread:
+            return
+        try:
+            self._recover()
+            pending = self.storage.pending_jobs()
+        except Exception as e:
+            logging.error(f"Ошибка загрузки запланированных курсов: {e}")
+            pending = []
+        with self._cond:
+            for job in pending:
+                self._push(datetime.fromisoformat(job["run_at"]), job["id"])
+            # Захват мог быть сделан незадолго до падения и ещё не просрочен
+            self._push(datetime.now() + timedelta(seconds=CLAIM_TIMEOUT_SECONDS), RECOVER)
+        logging.info(f"⏰ Планировщик запущен, ожидающих изменений: {len(pending)}")
+        self._thread = threading.Thread(target=self._run, name="rate-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def schedule(self, code, buy, sell, run_at, source=None, chat_id=None):
+        """Сохранение отложенного изменения курса; ValueError при неверных данных"""
+        buy, sell = validate_rates(buy, sell)
+        if not isinstance(run_at, datetime) or run_at.tzinfo:
+            run_at = parse_run_at(run_at.isoformat() if isinstance(run_at, datetime) else run_at)
+        if run_at <= datetime.now():
+            raise ValueError("Время применения должно быть в будущем")
+        if not self.storage.get_rate(code):
+            raise ValueError(f"Валюта {code} не найдена")
+
+        job = {
+            "code": code,
+            "buy": buy,
+            "sell": sell,
+            "run_at": run_at.isoformat(timespec="seconds"),
+            "status": "pending",
+            "source": source,
+            "chat_id": chat_id,
+            "created": datetime.now().isoformat(),
+        }
+        job["id"] = self.storage.add_job(job)
+        with self._cond:
+            self._push(run_at, job["id"])
+        logging.info(f"⏰ Запланировано {code}: {buy}/{sell} на {job['run_at']}")
+        return job
+
+    def cancel(self, job_id):
+        """Отмена ожидающего задания, True если оно было отменено"""
+        job_id = str(job_id)
+        if not self.storage.cancel_job(job_id, datetime.now().isoformat()):
+            return False
+        with self._cond:
+            self._cancelled.add(job_id)
+        logging.info(f"⏰ Отменено запланированное изменение {job_id}")
+        return True
+
+    def pending(self):
+        """Список ожидающих заданий, отсортированный по времени"""
+        jobs = self.storage.pending_jobs()
+        return sorted(jobs, key=lambda j: j["run_at"])
+
+    def _recover(self):
+        """Возврат в ожидание заданий с просроченным захватом"""
+        claimed_before = (datetime.now() - timedelta(seconds=CLAIM_TIMEOUT_SECONDS)).isoformat()
+        jobs = self.storage.release_jobs(claimed_before)
+        for j in jobs:
+            logging.warning(f"⚠️ Задание {j['id']} ({j['code']} на {j['run_at']}) не было завершено, повторное применение")
+        return jobs
+
+    def _push(self, run_at, job_id):
+        first = not self._heap or run_at < self._heap[0][0]
+        heapq.heappush(self._heap, (run_at, job_id))
+        if first:
+            self._cond.notify()
+
+    def _next_batch(self):
+        """Ожидание ближайшего срока; возвращает id всех готовых заданий"""
+        with self._cond:
+            while not self._stopped:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                delay = (self._heap[0][0] - datetime.now()).total_seconds()
+                if delay > 0:
+                    self._cond.wait(min(delay, MAX_SLEEP_SECONDS))
+                    continue
+                now = datetime.now()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    job_id = heapq.heappop(self._heap)[1]
+                    if job_id in self._cancelled:
+                        self._cancelled.discard(job_id)
+                    else:
+                        due.append(job_id)
+                if due:
+                    return due
+            return None
+
+    def _run(self):
+        while True:
+            due = self._next_batch()
+            if due is None:
+                return
+            try:
+                if RECOVER in due:
+                    due.remove(RECOVER)
+                    due += [j["id"] for j in self._recover()]
+                self._apply(due)
+            except Exception as e:
+                logging.error(f"Ошибка применения запланированных курсов: {e}")
+
+    def _apply(self, job_ids):
+        # Захват заданий: отменённые или применённые другим процессом пропускаются
+        jobs = self.storage.claim_jobs(job_ids, self.instance_id, datetime.now().isoformat())
+        if not jobs:
+            return
+        jobs.sort(key=lambda j: j["run_at"])
+        claimed = [j["id"] for j in jobs]
+
+        now = datetime.now().isoformat()
+        try:
+            self.storage.apply_rates([(j["code"], j["buy"], j["sell"]) for j in jobs], now)
+        except Exception as e:
+            self.storage.finish_jobs(claimed, "failed", error=str(e))
+            raise
+
+        self.storage.finish_jobs(claimed, "done", applied=now)
+        for j in jobs:
+            logging.info(f"⏰ Применено {j['code']}: {j['buy']}/{j['sell']} (запланировано на {j['run_at']})")
+        if self.on_applied:
+            self.on_applied(jobs)
@@ -0,0 +1,400 @@
+import logging
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager, nullcontext
+
+RATE_FIELDS = ["code", "flag", "name", "showRates", "buy", "sell", "updated"]
+JOB_FIELDS = ["code", "buy", "sell", "run_at", "status", "source", "chat_id", "created"]
+
+# Бот и API запускаются из разных рабочих каталогов и читают разные .env,
+# поэтому относительный путь к SQLite отсчитывается от каталога с кодом
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SQLITE_PATH = os.path.join(BASE_DIR, "operkassa.db")
+
+
+class RatesBackend(ABC):
+    """Хранилище курсов и отложенных изменений.
+
+    Курсы — словари с полями RATE_FIELDS (без служебного _id), задания —
+    словари с полями JOB_FIELDS и строковым id. Реализации: MongoBackend и
+    SQLiteBackend, выбираются через create_backend().
+    """
+
+    name = None
+
+    @abstractmethod
+    def ping(self):
+        ...
+
+    @abstractmethod
+    def list_rates(self):
+        ...
+
+    @abstractmethod
+    def get_rate(self, code):
+        ...
+
+    @abstractmethod
+    def replace_rates(self, rates):
+        ...
+
+    @abstractmethod
+    def update_rate(self, code, buy, sell, updated):
+        ...
+
+    @abstractmethod
+    def apply_rates(self, updates, updated):
+        """Одна пакетная запись списка (code, buy, sell) в порядке следования"""
+
+    @abstractmethod
+    def add_job(self, job):
+        ...
+
+    @abstractmethod
+    def pending_jobs(self):
+        ...
+
+    @abstractmethod
+    def cancel_job(self, job_id, cancelled):
+        """True, если ожидающее задание было отменено"""
+
+    @abstractmethod
+    def claim_jobs(self, job_ids, owner, claimed):
+        """Атомарный захват ожидающих заданий; возвращает захваченные"""
+
+    @abstractmethod
+    def release_jobs(self, claimed_before):
+        """Возврат в ожидание заданий, захваченных раньше claimed_before; возвращает их"""
+
+    @abstractmethod
+    def finish_jobs(self, job_ids, status, **fields):
+        ...
+
+    def close(self):
+        pass
+
+
+class MongoBackend(RatesBackend):
+    name = "MongoDB"
+
+    def __init__(self, uri, db_name="operkassa_db", server_api=None):
+        """server_api — версия Stable API MongoDB, например "1" """
+        from pymongo import MongoClient
+        from pymongo.server_api import ServerApi
+
+        self.client = MongoClient(uri, server_api=ServerApi(server_api)) if server_api else MongoClient(uri)
+        db = self.client[db_name]
+        self.rates = db["rates"]
+        self.jobs = db["scheduled_rates"]
+
+    def ping(self):
+        self.client.admin.command("ping")
+
+    def list_rates(self):
+        return list(self.rates.find({}, {"_id": 0}))
+
+    def get_rate(self, code):
+        return self.rates.find_one({"code": code}, {"_id": 0})
+
+    def replace_rates(self, rates):
+        self.rates.delete_many({})
+        self.rates.insert_many([dict(r) for r in rates])
+
+    def update_rate(self, code, buy, sell, updated):
+        self.rates.update_one(
+            {"code": code},
+            {"$set": {"buy": float(buy), "sell": float(sell), "updated": updated}},
+            upsert=True
+        )
+
+    def apply_rates(self, updates, updated):
+        from pymongo import UpdateOne
+
+        self.rates.bulk_write([
+            UpdateOne({"code": code}, {"$set": {"buy": buy, "sell": sell, "updated": updated}}, upsert=True)
+            for code, buy, sell in updates
+        ], ordered=True)
+
+    @staticmethod
+    def _ids(job_ids):
+        from bson import ObjectId
+        from bson.errors import InvalidId
+
+        ids = []
+        for job_id in job_ids:
+            try:
+                ids.append(ObjectId(job_id))
+            except (InvalidId, TypeError):
+                pass
+        return ids
+
+    @staticmethod
+    def _job(doc):
+        job = {k: doc.get(k) for k in JOB_FIELDS}
+        job["id"] = str(doc["_id"])
+        return job
+
+    def add_job(self, job):
+        return str(self.jobs.insert_one(dict(job)).inserted_id)
+
+    def pending_jobs(self):
+        return [self._job(d) for d in self.jobs.find({"status": "pending"})]
+
+    def cancel_job(self, job_id, cancelled):
+        ids = self._ids([job_id])
+        if not ids:
+            return False
+        result = self.jobs.update_one(
+            {"_id": ids[0], "status": "pending"},
+            {"$set": {"status": "cancelled", "cancelled": cancelled}}
+        )
+        return bool(result.modified_count)
+
+    def claim_jobs(self, job_ids, owner, claimed):
+        ids = self._ids(job_ids)
+        self.jobs.update_many(
+            {"_id": {"$in": ids}, "status": "pending"},
+            {"$set": {"status": "running", "claimed_by": owner, "claimed": claimed}}
+        )
+        return [self._job(d) for d in self.jobs.find({"_id": {"$in": ids}, "status": "running", "claimed_by": owner})]
+
+    def release_jobs(self, claimed_before):
+        # Задания без времени захвата считаются просроченными
+        stale = {"status": "running", "$or": [{"claimed": {"$lt": claimed_before}}, {"claimed": None}]}
+        jobs = [self._job(d) for d in self.jobs.find(stale)]
+        if jobs:
+            self.jobs.update_many(
+                dict(stale, _id={"$in": self._ids(j["id"] for j in jobs)}),
+                {"$set": {"status": "pending", "claimed_by": None, "claimed": None}}
+            )
+        return jobs
+
+    def finish_jobs(self, job_ids, status, **fields):
+        self.jobs.update_many({"_id": {"$in": self._ids(job_ids)}}, {"$set": dict(fields, status=status)})
+
+    def close(self):
+        self.client.close()
+
+
+class SQLiteBackend(RatesBackend):
+    """Встроенная база SQLite в режиме WAL.
+
+    Каждый поток получает своё соединение, поэтому бот и API на одном хосте
+    читают файл параллельно, а запись ждёт не дольше busy_timeout.
+    Путь ':memory:' даёт одно общее соединение (для тестов и loadtest.py).
+    """
+
+    name = "SQLite"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS rates (
+            code TEXT PRIMARY KEY,
+            flag TEXT,
+            name TEXT,
+            showRates INTEGER,
+            buy REAL,
+            sell REAL,
+            updated TEXT
+        );
+        CREATE TABLE IF NOT EXISTS scheduled_rates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT NOT NULL,
+            buy REAL NOT NULL,
+            sell REAL NOT NULL,
+            run_at TEXT NOT NULL,
+            status TEXT NOT NULL,
+            source TEXT,
+            chat_id INTEGER,
+            created TEXT,
+            claimed_by TEXT,
+            claimed TEXT,
+            applied TEXT,
+            cancelled TEXT,
+            error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS scheduled_rates_status ON scheduled_rates (status, run_at);
+    """
+
+    def __init__(self, path, busy_timeout=5.0):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._shared = None
+        self._lock = None
+        if path == ":memory:":
+            self._shared = self._open()
+            self._lock = threading.RLock()
+        with self._guard():
+            conn = self._conn()
+            conn.executescript(self.SCHEMA)
+            # Базы, созданные до появления времени захвата заданий
+            columns = {r["name"] for r in conn.execute("PRAGMA table_info(scheduled_rates)")}
+            if "claimed" not in columns:
+                conn.execute("ALTER TABLE scheduled_rates ADD COLUMN claimed TEXT")
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        if self._shared:
+            return self._shared
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        return conn
+
+    def _guard(self):
+        return self._lock or nullcontext()
+
+    @contextmanager
+    def _write(self):
+        with self._guard():
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _read(self, sql, params=()):
+        with self._guard():
+            return self._conn().execute(sql, params).fetchall()
+
+    @staticmethod
+    def _rate(row):
+        rate = {k: row[k] for k in RATE_FIELDS if row[k] is not None}
+        if "showRates" in rate:
+            rate["showRates"] = bool(rate["showRates"])
+        return rate
+
+    @staticmethod
+    def _job(row):
+        job = {k: row[k] for k in JOB_FIELDS}
+        job["id"] = str(row["id"])
+        return job
+
+    @staticmethod
+    def _ids(job_ids):
+        return [int(j) for j in job_ids if str(j).isdigit()]
+
+    def ping(self):
+        self._read("SELECT 1")
+
+    def list_rates(self):
+        return [self._rate(r) for r in self._read(f"SELECT {', '.join(RATE_FIELDS)} FROM rates ORDER BY rowid")]
+
+    def get_rate(self, code):
+        rows = self._read(f"SELECT {', '.join(RATE_FIELDS)} FROM rates WHERE code = ?", (code,))
+        return self._rate(rows[0]) if rows else None
+
+    def replace_rates(self, rates):
+        with self._write() as conn:
+            conn.execute("DELETE FROM rates")
+            conn.executemany(
+                f"INSERT INTO rates ({', '.join(RATE_FIELDS)}) VALUES ({', '.join('?' * len(RATE_FIELDS))})",
+                [[r.get(k) for k in RATE_FIELDS] for r in rates]
+            )
+
+    UPSERT_RATE = """
+        INSERT INTO rates (code, buy, sell, updated) VALUES (?, ?, ?, ?)
+        ON CONFLICT (code) DO UPDATE SET buy = excluded.buy, sell = excluded.sell, updated = excluded.updated
+    """
+
+    def update_rate(self, code, buy, sell, updated):
+        with self._write() as conn:
+            conn.execute(self.UPSERT_RATE, (code, float(buy), float(sell), updated))
+
+    def apply_rates(self, updates, updated):
+        with self._write() as conn:
+            conn.executemany(self.UPSERT_RATE, [(code, buy, sell, updated) for code, buy, sell in updates])
+
+    def add_job(self, job):
+        with self._write() as conn:
+            cursor = conn.execute(
+                f"INSERT INTO scheduled_rates ({', '.join(JOB_FIELDS)}) VALUES ({', '.join('?' * len(JOB_FIELDS))})",
+                [job.get(k) for k in JOB_FIELDS]
+            )
+            return str(cursor.lastrowid)
+
+    def pending_jobs(self):
+        return [self._job(r) for r in self._read("SELECT * FROM scheduled_rates WHERE status = 'pending'")]
+
+    def cancel_job(self, job_id, cancelled):
+        ids = self._ids([job_id])
+        if not ids:
+            return False
+        with self._write() as conn:
+            cursor = conn.execute(
+                "UPDATE scheduled_rates SET status = 'cancelled', cancelled = ? WHERE id = ? AND status = 'pending'",
+                (cancelled, ids[0])
+            )
+            return cursor.rowcount > 0
+
+    def claim_jobs(self, job_ids, owner, claimed):
+        ids = self._ids(job_ids)
+        if not ids:
+            return []
+        marks = ', '.join('?' * len(ids))
+        with self._write() as conn:
+            conn.execute(
+                f"UPDATE scheduled_rates SET status = 'running', claimed_by = ?, claimed = ? "
+                f"WHERE id IN ({marks}) AND status = 'pending'",
+                [owner, claimed, *ids]
+            )
+            rows = conn.execute(
+                f"SELECT * FROM scheduled_rates WHERE id IN ({marks}) AND status = 'running' AND claimed_by = ?",
+                [*ids, owner]
+            ).fetchall()
+        return [self._job(r) for r in rows]
+
+    def release_jobs(self, claimed_before):
+        stale = "status = 'running' AND (claimed IS NULL OR claimed < ?)"
+        with self._write() as conn:
+            rows = conn.execute(f"SELECT * FROM scheduled_rates WHERE {stale}", (claimed_before,)).fetchall()
+            conn.execute(
+                f"UPDATE scheduled_rates SET status = 'pending', claimed_by = NULL, claimed = NULL WHERE {stale}",
+                (claimed_before,)
+            )
+        return [self._job(r) for r in rows]
+
+    def finish_jobs(self, job_ids, status, **fields):
+        ids = self._ids(job_ids)
+        if not ids:
+            return
+        columns = ', '.join(f"{k} = ?" for k in ["status", *fields])
+        with self._write() as conn:
+            conn.execute(
+                f"UPDATE scheduled_rates SET {columns} WHERE id IN ({', '.join('?' * len(ids))})",
+                [status, *fields.values(), *ids]
+            )
+
+    def close(self):
+        if self._shared:
+            self._shared.close()
+        conn = getattr(self._local, "conn", None)
+        if conn:
+            conn.close()
+
+
+def create_backend(kind, mongo_uri=None, sqlite_path=None, server_api=None):
+    """Хранилище по имени из конфигурации: mongo или sqlite"""
+    if kind == "mongo":
+        if not mongo_uri:
+            raise ValueError("MONGO_URI не установлен")
+        return MongoBackend(mongo_uri, server_api=server_api)
+    if kind == "sqlite":
+        path = sqlite_path or DEFAULT_SQLITE_PATH
+        if path != ":memory:":
+            path = os.path.join(BASE_DIR, path)  # абсолютный путь не меняется
+        backend = SQLiteBackend(path)
+        logging.info(f"🗄 SQLite: {backend.path}")
+        return backend
+    raise ValueError(f"Неизвестное хранилище: {kind}")
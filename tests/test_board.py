@@ -0,0 +1,42 @@
+import pytest
+
+from board import BoardCache, render_png, render_svg
+from rates_log import RateChangeLog
+
+EUR = {"code": "EUR", "name": "Евро", "showRates": True, "buy": 94.5, "sell": 96.0}
+
+
+def board(cache, log):
+    """Тот же путь, что и в api.rates_board: версия журнала -> кеш табло"""
+    log.refresh(force=True)
+    version, rates = log.snapshot()
+    return cache.get(("svg", "all", "ru"), version, lambda: render_svg(rates))
+
+
+def test_etag_changes_with_rates():
+    rates = [dict(EUR)]
+    cache, log = BoardCache(), RateChangeLog(lambda: [dict(r) for r in rates])
+    body, etag = board(cache, log)
+    assert board(cache, log) == (body, etag)
+
+    rates[0]["buy"] = 95.0
+    new_body, new_etag = board(cache, log)
+    assert new_etag != etag
+    assert "95.00" in new_body
+
+
+def test_etag_changes_when_empty_store_is_populated():
+    rates = []
+    cache, log = BoardCache(), RateChangeLog(lambda: [dict(r) for r in rates])
+    _, etag = board(cache, log)
+
+    rates.append(dict(EUR))
+    body, new_etag = board(cache, log)
+    assert new_etag != etag
+    assert "Евро" in body
+
+
+def test_png_without_font_fails(tmp_path):
+    pytest.importorskip("PIL")
+    with pytest.raises(OSError):
+        render_png([EUR], font_path=str(tmp_path / "missing.ttf"))
@@ -0,0 +1,69 @@
+import pytest
+
+from keypad import KEYPAD_RE, EditSessions, apply_keypad_key
+
+
+def editor(buy="81.50", sell="82.20"):
+    return {"buy": buy, "sell": sell, "field": "buy", "fresh": True}
+
+
+def press(session, keys):
+    for key in keys:
+        apply_keypad_key(session, key)
+    return session
+
+
+def test_first_digit_replaces_value():
+    assert press(editor(), "82.3")["buy"] == "82.3"
+
+
+def test_backspace_and_single_dot():
+    assert press(editor(), ["8", "1", ".", ".", "5", "<"])["buy"] == "81."
+
+
+def test_leading_zero_and_dot():
+    assert press(editor(), ["0", "5"])["buy"] == "5"
+    assert press(editor(), ["."])["buy"] == "0."
+
+
+def test_length_and_precision_limits():
+    assert press(editor(), "1.23456")["buy"] == "1.2345"
+    assert press(editor(), "123456789")["buy"] == "12345678"
+
+
+def test_step_buttons():
+    session = press(editor(), ["+10", "+5", "-5"])
+    assert session["buy"] == "81.60"
+    assert press(editor(buy="0.03"), ["-10"])["buy"] == "0.00"
+
+
+def test_step_then_digit_starts_new_value():
+    assert press(editor(), ["+5", "9"])["buy"] == "9"
+
+
+def test_switch_field():
+    session = press(editor(), ["9", "f", "7"])
+    assert (session["buy"], session["sell"], session["field"]) == ("9", "7", "sell")
+
+
+@pytest.mark.parametrize("data, key", [("k:7", "7"), ("k:<", "<"), ("k:-10", "-10"), ("k:ok", "ok")])
+def test_keypad_re(data, key):
+    assert KEYPAD_RE.match(data).group(1) == key
+
+
+@pytest.mark.parametrize("data", ["k:+1", "k:ab", "k:", "edit_EUR"])
+def test_keypad_re_rejects(data):
+    assert not KEYPAD_RE.match(data)
+
+
+def test_sessions_close_and_expire():
+    sessions = EditSessions(ttl=60)
+    session = sessions.open(1, 10, 42, **editor())
+    assert sessions.get(1, 10) is session and session["user_id"] == 42
+
+    sessions.close(1, 10)
+    assert session["closed"] and sessions.get(1, 10) is None
+
+    sessions.ttl = -1
+    stale = sessions.open(1, 11, 42, **editor())
+    assert sessions.get(1, 11) is None and stale["closed"]
@@ -0,0 +1,77 @@
+import pytest
+
+from rates_log import RateChangeLog, parse_version
+
+
+class Rates:
+    def __init__(self, **rates):
+        self.rates = rates
+
+    def load(self):
+        return [{"code": code, "buy": buy} for code, buy in self.rates.items()]
+
+
+def make_log(max_entries=2, **rates):
+    source = Rates(**rates)
+    log = RateChangeLog(source.load, max_entries=max_entries)
+    log.refresh(force=True)
+    return source, log
+
+
+def test_changes_since_current_version_is_empty():
+    _, log = make_log(EUR=1.0)
+
+    assert log.changes_since(log.version) == (log.version, False, [], [])
+
+
+def test_changes_since_returns_latest_and_removed():
+    source, log = make_log(EUR=1.0, USD=2.0)
+    since = log.version
+    source.rates = {"EUR": 1.5}
+    log.refresh(force=True)
+
+    version, full, currencies, removed = log.changes_since(since)
+    assert not full
+    assert currencies == [{"code": "EUR", "buy": 1.5}]
+    assert removed == ["USD"]
+
+
+def test_changes_since_empty_store_then_populated():
+    source, log = make_log()
+    since = log.version
+    assert log.changes_since(since) == (since, False, [], [])
+
+    source.rates = {"EUR": 1.0}
+    log.refresh(force=True)
+    version, full, currencies, removed = log.changes_since(since)
+    assert version != since
+    assert (full, currencies, removed) == (False, [{"code": "EUR", "buy": 1.0}], [])
+
+
+def test_changes_since_at_log_edge():
+    source, log = make_log(max_entries=2, EUR=1.0)
+    versions = [log.version]
+    for buy in (2.0, 3.0, 4.0):
+        source.rates = {"EUR": buy}
+        log.refresh(force=True)
+        versions.append(log.version)
+
+    # Записи 1 и 2 вытеснены; с версии 1 все последующие изменения ещё в журнале
+    assert log.changes_since(versions[0])[1]
+    assert not log.changes_since(versions[1])[1]
+    assert log.changes_since(versions[1])[2] == [{"code": "EUR", "buy": 4.0}]
+
+
+def test_changes_since_other_epoch_or_future_is_full():
+    _, log = make_log(EUR=1.0)
+    _, other = make_log(EUR=1.0)
+
+    assert log.changes_since(other.version)[1]
+    assert log.changes_since(f"{log.epoch}-{log.seq + 1}")[1]
+    assert log.changes_since(None)[1]
+
+
+@pytest.mark.parametrize("value", ["12", "-3", "abc-", "abc-x"])
+def test_parse_version_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        parse_version(value)
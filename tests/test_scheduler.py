@@ -0,0 +1,108 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from scheduler import RateScheduler, validate_rates
+from storage import SQLiteBackend
+
+
+@pytest.fixture
+def storage():
+    storage = SQLiteBackend(":memory:")
+    storage.replace_rates([
+        {"code": "EUR", "name": "Евро", "showRates": True, "buy": 94.5, "sell": 96.0},
+        {"code": "USD_BLUE", "name": "Доллар США (синий)", "showRates": True, "buy": 81.5, "sell": 82.2},
+    ])
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def applied():
+    batches = []
+    done = threading.Event()
+
+    def on_applied(jobs):
+        batches.append([j["id"] for j in jobs])
+        done.set()
+
+    on_applied.batches = batches
+    on_applied.done = done
+    return on_applied
+
+
+@pytest.fixture
+def scheduler(storage, applied):
+    scheduler = RateScheduler(storage, on_applied=applied)
+    yield scheduler
+    scheduler.stop()
+
+
+def add_job(storage, code, buy, sell, minutes):
+    run_at = (datetime.now() + timedelta(minutes=minutes)).isoformat(timespec="seconds")
+    return storage.add_job({"code": code, "buy": buy, "sell": sell, "run_at": run_at, "status": "pending"})
+
+
+def statuses(storage):
+    return {str(r["id"]): r["status"] for r in storage._read("SELECT id, status FROM scheduled_rates")}
+
+
+@pytest.mark.parametrize("buy, sell", [("nan", "96"), ("94", "inf"), ("-inf", "96"), ("abc", "96"), (0, 1), (96, 95)])
+def test_validate_rates_rejects(buy, sell):
+    with pytest.raises(ValueError):
+        validate_rates(buy, sell)
+
+
+def test_schedule_rejects_invalid(scheduler):
+    later = datetime.now() + timedelta(hours=1)
+    with pytest.raises(ValueError):
+        scheduler.schedule("EUR", "nan", "inf", later)
+    with pytest.raises(ValueError):
+        scheduler.schedule("EUR", 95, 97, datetime.now() - timedelta(minutes=1))
+    with pytest.raises(ValueError):
+        scheduler.schedule("XXX", 95, 97, later)
+    assert scheduler.pending() == []
+
+
+def test_due_jobs_reloaded_and_applied_in_one_batch(storage, scheduler, applied):
+    # Задания, сохранённые до перезапуска и ставшие готовыми за время простоя
+    first = add_job(storage, "EUR", 95.0, 97.0, -2)
+    second = add_job(storage, "EUR", 95.5, 97.5, -1)
+    other = add_job(storage, "USD_BLUE", 82.0, 83.0, -1)
+    later = add_job(storage, "EUR", 99.0, 100.0, 60)
+
+    scheduler.start()
+    assert applied.done.wait(5)
+    assert applied.batches == [[first, second, other]]
+    assert (storage.get_rate("EUR")["buy"], storage.get_rate("EUR")["sell"]) == (95.5, 97.5)
+    assert storage.get_rate("USD_BLUE")["buy"] == 82.0
+    assert statuses(storage) == {first: "done", second: "done", other: "done", later: "pending"}
+    assert [j["id"] for j in scheduler.pending()] == [later]
+
+
+def test_cancel(storage, scheduler):
+    job = scheduler.schedule("EUR", 95, 97, datetime.now() + timedelta(hours=1), source="test")
+
+    assert [j["id"] for j in scheduler.pending()] == [job["id"]]
+    assert scheduler.cancel(job["id"])
+    assert not scheduler.cancel(job["id"])
+    assert scheduler.pending() == []
+
+    scheduler._apply([job["id"]])
+    assert statuses(storage) == {job["id"]: "cancelled"}
+    assert storage.get_rate("EUR")["buy"] == 94.5
+
+
+def test_stale_claim_recovered_on_start(storage, scheduler, applied):
+    stale = add_job(storage, "EUR", 95.0, 97.0, -1)
+    fresh = add_job(storage, "USD_BLUE", 82.0, 83.0, -1)
+    storage.claim_jobs([stale], "crashed", (datetime.now() - timedelta(hours=1)).isoformat())
+    storage.claim_jobs([fresh], "alive", datetime.now().isoformat())
+
+    scheduler.start()
+    assert applied.done.wait(5)
+    assert applied.batches == [[stale]]
+    assert storage.get_rate("EUR")["buy"] == 95.0
+    # Свежий захват принадлежит работающему процессу и не трогается
+    assert statuses(storage) == {stale: "done", fresh: "running"}
@@ -0,0 +1,76 @@
+import pytest
+
+from storage import RatesBackend, SQLiteBackend
+
+
+@pytest.fixture
+def backend():
+    backend = SQLiteBackend(":memory:")
+    backend.replace_rates([
+        {"code": "USD_BLUE", "flag": "us", "name": "Доллар США (синий)", "showRates": True, "buy": 81.5, "sell": 82.2},
+        {"code": "EUR", "flag": "eu", "name": "Евро", "showRates": True, "buy": 94.5, "sell": 96.0},
+    ])
+    yield backend
+    backend.close()
+
+
+def add_job(backend, code="EUR", run_at="2099-01-01T09:00:00"):
+    return backend.add_job({"code": code, "buy": 95.0, "sell": 97.0, "run_at": run_at, "status": "pending"})
+
+
+def test_rates_backend_is_abstract():
+    with pytest.raises(TypeError):
+        RatesBackend()
+
+
+def test_claim_jobs_once(backend):
+    job_id = add_job(backend)
+
+    claimed = backend.claim_jobs([job_id], "a", "2099-01-01T09:00:00")
+    assert [j["id"] for j in claimed] == [job_id]
+    assert claimed[0]["status"] == "running"
+    assert backend.claim_jobs([job_id], "b", "2099-01-01T09:00:01") == []
+    assert backend.pending_jobs() == []
+
+
+def test_claim_jobs_skips_unknown_ids(backend):
+    job_id = add_job(backend)
+
+    claimed = backend.claim_jobs([job_id, "999", "not-an-id"], "a", "2099-01-01T09:00:00")
+    assert [j["id"] for j in claimed] == [job_id]
+    assert backend.claim_jobs([], "a", "2099-01-01T09:00:00") == []
+
+
+def test_cancel_job(backend):
+    job_id = add_job(backend)
+
+    assert backend.cancel_job(job_id, "2099-01-01T08:00:00")
+    assert not backend.cancel_job(job_id, "2099-01-01T08:00:00")
+    assert backend.pending_jobs() == []
+    assert backend.claim_jobs([job_id], "a", "2099-01-01T09:00:00") == []
+
+
+def test_cancel_claimed_job_fails(backend):
+    job_id = add_job(backend)
+    backend.claim_jobs([job_id], "a", "2099-01-01T09:00:00")
+
+    assert not backend.cancel_job(job_id, "2099-01-01T09:00:01")
+    assert not backend.cancel_job("not-an-id", "2099-01-01T09:00:01")
+
+
+def test_release_jobs_returns_only_stale_claims(backend):
+    stale, fresh = add_job(backend), add_job(backend, code="USD_BLUE")
+    backend.claim_jobs([stale], "dead", "2099-01-01T08:00:00")
+    backend.claim_jobs([fresh], "alive", "2099-01-01T09:00:00")
+
+    released = backend.release_jobs("2099-01-01T08:30:00")
+    assert [j["id"] for j in released] == [stale]
+    assert [j["id"] for j in backend.pending_jobs()] == [stale]
+
+
+def test_apply_rates_in_order(backend):
+    backend.apply_rates([("EUR", 95.0, 97.0), ("EUR", 95.5, 97.5)], "2099-01-01T09:00:00")
+
+    rate = backend.get_rate("EUR")
+    assert (rate["buy"], rate["sell"], rate["updated"]) == (95.5, 97.5, "2099-01-01T09:00:00")
+    assert rate["showRates"] is True
@@ -0,0 +1,225 @@
+import heapq
+import itertools
+import logging
+import queue
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from telebot import apihelper
+from urllib3.exceptions import ConnectTimeoutError
+
+INTERACTIVE = 0
+BULK = 1
+
+# (connect, read) по методам; getUpdates использует таймауты long polling от telebot
+DEFAULT_TIMEOUTS = {
+    'default': (3.05, 10),
+    'answerCallbackQuery': (3.05, 5),
+    'sendDocument': (3.05, 60),
+    'sendPhoto': (3.05, 60),
+}
+
+
+class _Call:
+    def __init__(self, args, priority, seq):
+        self.args = args
+        self.priority = priority
+        self.seq = seq
+        self.attempt = 0
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class TelegramClient:
+    """Исходящий клиент Bot API: пул соединений, таймауты, повторы и приоритеты.
+
+    Подключается к telebot через apihelper.CUSTOM_REQUEST_SENDER. Запросы
+    (кроме getUpdates) проходят через очередь с приоритетом: ответы
+    пользователям идут раньше массовых рассылок (см. bulk()). На 429
+    запрос повторяется через retry_after, на 5xx и ошибки соединения — через
+    экспоненциальную паузу со случайным разбросом. Обрыв соединения после
+    отправки повторяется только для методов get*, чтобы не задвоить сообщения. Ожидающий повтора запрос
+    откладывается в отдельную кучу и не занимает поток отправки: потоки всегда
+    берут самый приоритетный готовый запрос.
+    """
+
+    def __init__(self, pool_size=10, workers=4, retries=3, backoff=0.5, max_backoff=30, timeouts=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._delayed = []  # (monotonic not_before, seq, call)
+        self._delayed_cond = threading.Condition()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._latency = defaultdict(lambda: deque(maxlen=1000))
+        self._counters = defaultdict(lambda: defaultdict(int))
+        for i in range(workers):
+            threading.Thread(target=self._worker, name=f"tg-sender-{i}", daemon=True).start()
+        threading.Thread(target=self._release_delayed, name="tg-retry", daemon=True).start()
+
+    def install(self, api_url=None):
+        """Подключение клиента к telebot; api_url — другой сервер Bot API"""
+        apihelper.CUSTOM_REQUEST_SENDER = self.request
+        if api_url:
+            apihelper.API_URL = api_url.rstrip('/') + '/bot{0}/{1}'
+            apihelper.FILE_URL = api_url.rstrip('/') + '/file/bot{0}/{1}'
+
+    @contextmanager
+    def bulk(self):
+        """Запросы внутри блока уступают очередь интерактивным ответам"""
+        previous = getattr(self._local, 'priority', INTERACTIVE)
+        self._local.priority = BULK
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def request(self, method, url, params=None, files=None, timeout=None, proxies=None):
+        """Совместим с сигнатурой CUSTOM_REQUEST_SENDER telebot"""
+        name = url.rsplit('/', 1)[-1]
+        if name == 'getUpdates':
+            return self._send(name, method, url, params, files, timeout, proxies)
+
+        call = _Call(
+            (name, method, url, params, files, self.timeouts.get(name, self.timeouts['default']), proxies),
+            getattr(self._local, 'priority', INTERACTIVE),
+            next(self._seq)
+        )
+        start = time.perf_counter()
+        self._queue.put((call.priority, call.seq, call))
+        call.done.wait()
+        self._record(name, time.perf_counter() - start)
+        if call.error:
+            raise call.error
+        return call.result
+
+    def _worker(self):
+        while True:
+            _, _, call = self._queue.get()
+            try:
+                response, delay = self._attempt(call.attempt, *call.args)
+            except Exception as e:
+                call.error = e
+                call.done.set()
+                continue
+            if delay is None:
+                call.result = response
+                call.done.set()
+            else:
+                call.attempt += 1
+                with self._delayed_cond:
+                    heapq.heappush(self._delayed, (time.monotonic() + delay, call.seq, call))
+                    self._delayed_cond.notify()
+
+    def _release_delayed(self):
+        """Возврат отложенных запросов в очередь по наступлении их времени"""
+        with self._delayed_cond:
+            while True:
+                if not self._delayed:
+                    self._delayed_cond.wait()
+                    continue
+                wait = self._delayed[0][0] - time.monotonic()
+                if wait > 0:
+                    self._delayed_cond.wait(wait)
+                    continue
+                _, _, call = heapq.heappop(self._delayed)
+                # Прежний порядковый номер: повтор не уступает более новым запросам того же приоритета
+                self._queue.put((call.priority, call.seq, call))
+
+    def _send(self, name, method, url, params, files, timeout, proxies):
+        """Запрос с повторами в вызывающем потоке (getUpdates)"""
+        attempt = 0
+        while True:
+            response, delay = self._attempt(attempt, name, method, url, params, files, timeout, proxies)
+            if delay is None:
+                return response
+            attempt += 1
+            time.sleep(delay)
+
+    def _attempt(self, attempt, name, method, url, params, files, timeout, proxies):
+        """Одна попытка: (response, None) — готово, (None, delay) — повторить через delay секунд"""
+        try:
+            response = self.session.request(
+                method, url, params=params, files=files, timeout=timeout, proxies=proxies
+            )
+        except requests.exceptions.ConnectionError as e:
+            if files or attempt >= self.retries or not self._safe_to_retry(name, e):
+                self._count(name, 'errors')
+                raise
+            delay = self._backoff_delay(attempt)
+            logging.warning(f"⚠️ {name}: ошибка соединения ({e}), повтор через {delay:.2f} с")
+        else:
+            if response.status_code == 429:
+                self._count(name, 'throttled')
+                delay = self._retry_after(response) + random.uniform(0, self.backoff)
+            elif response.status_code >= 500:
+                self._count(name, 'server_errors')
+                delay = self._backoff_delay(attempt)
+            else:
+                self._count(name, 'ok' if response.status_code == 200 else 'errors')
+                return response, None
+            if files or attempt >= self.retries:
+                return response, None
+            logging.warning(f"⚠️ {name}: HTTP {response.status_code}, повтор через {delay:.2f} с")
+        self._count(name, 'retries')
+        return None, delay
+
+    @staticmethod
+    def _safe_to_retry(name, error):
+        """Повтор не отправит сообщение дважды: запрос только читает данные
+        или соединение не было установлено (таймаут подключения, отказ, DNS).
+        Обрыв после отправки (RemoteDisconnected и т. п.) не повторяется."""
+        if name.startswith('get') or isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        reason = error.args[0] if error.args else None
+        # requests оборачивает MaxRetryError из urllib3, причина — в .reason
+        reason = getattr(reason, 'reason', reason)
+        return isinstance(reason, ConnectTimeoutError)  # в т. ч. NewConnectionError
+
+    def _backoff_delay(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def _retry_after(self, response):
+        try:
+            return float(response.json().get('parameters', {}).get('retry_after', 1))
+        except (ValueError, AttributeError):
+            return 1.0
+
+    def _count(self, name, key):
+        with self._lock:
+            self._counters[name][key] += 1
+
+    def _record(self, name, seconds):
+        with self._lock:
+            self._latency[name].append(seconds)
+
+    def stats(self):
+        """Счётчики и задержки (мс, включая ожидание в очереди) по методам"""
+        with self._lock:
+            result = {}
+            for name in set(self._latency) | set(self._counters):
+                samples = sorted(self._latency[name])
+                entry = dict(self._counters[name])
+                if samples:
+                    entry.update({
+                        'calls': len(samples),
+                        'p50_ms': round(samples[len(samples) // 2] * 1000, 1),
+                        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 1),
+                        'max_ms': round(samples[-1] * 1000, 1),
+                    })
+                result[name] = entry
+            return result